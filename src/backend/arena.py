@@ -0,0 +1,79 @@
+import numpy
+
+# edges per chunk
+CHUNK_EDGES = 1 << 18
+# bytes a chunk takes per edge
+EDGE_BYTES = 15
+
+
+class Chunk:
+    """ Preallocated edge arrays, one per statistic """
+
+    __slots__ = ("moves", "N", "Q", "P", "LM")
+
+    def __init__(self, size):
+
+        self.moves = numpy.zeros(size, numpy.int16)
+        self.N = numpy.zeros(size, numpy.float32)
+        self.Q = numpy.zeros(size, numpy.float32)
+        self.P = numpy.zeros(size, numpy.float32)
+        self.LM = numpy.ones(size, numpy.bool_)
+
+
+class EdgeArena:
+    """ Storage of the edge statistics of a search tree.
+
+        The edges of a node are a contiguous range of a chunk and the
+        arrays of the node are views of that range, so that nodes don't
+        allocate arrays of their own and selection is still one
+        vectorised pass over a slice. The arena grows by whole chunks.
+        Edges of dropped subtrees are only freed by compact(), which
+        copies the edges of the nodes still in use to a fresh chunk. """
+
+    def __init__(self, chunk_edges=CHUNK_EDGES):
+
+        self.chunk_edges = chunk_edges
+        self.chunks = []
+        self.free = 0
+        # number of edges the chunks have room for
+        self.edges = 0
+
+    def allocate(self, node, moves):
+        """ Give node views of a new range of edges for moves """
+        k = len(moves)
+        if k > self.free:
+            self.chunks.append(Chunk(max(k, self.chunk_edges)))
+            self.free = len(self.chunks[-1].N)
+            self.edges += self.free
+        chunk = self.chunks[-1]
+        start = len(chunk.N) - self.free
+        self.free -= k
+        self._bind(node, chunk, start, start + k)
+        node.moves[:] = moves
+
+    @staticmethod
+    def _bind(node, chunk, start, end):
+        node.moves = chunk.moves[start:end]
+        node.N = chunk.N[start:end]
+        node.Q = chunk.Q[start:end]
+        node.P = chunk.P[start:end]
+        node.LM = chunk.LM[start:end]
+
+    def compact(self, nodes):
+        """ Move the edges of nodes into one new chunk, in the given
+            order, and drop all other edges """
+        total = sum(len(node.N) for node in nodes)
+        chunk = Chunk(max(total, self.chunk_edges))
+        start = 0
+        for node in nodes:
+            end = start + len(node.N)
+            chunk.moves[start:end] = node.moves
+            chunk.N[start:end] = node.N
+            chunk.Q[start:end] = node.Q
+            chunk.P[start:end] = node.P
+            chunk.LM[start:end] = node.LM
+            self._bind(node, chunk, start, end)
+            start = end
+        self.chunks = [chunk]
+        self.free = len(chunk.N) - total
+        self.edges = len(chunk.N)
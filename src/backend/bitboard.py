@@ -0,0 +1,316 @@
+#! /usr/bin/env python
+import random
+import time
+import logging
+import constants as ct
+import backend.geometry as geo
+import backend.zobrist as zobrist
+import backend.twixt as twixt
+from backend.point import Point
+from backend.unionfind import PegConnections
+from backend.potential import PotentialPaths
+
+S = geo.SIZE
+
+
+class BitboardGame(twixt.Game):
+    """ twixt.Game with pegs and links kept in python int bitboards.
+
+        play() and undo() only touch a few ints and precomputed tables.
+        The numpy planes (pegs, links) are built on demand, e.g. for
+        naf.NetInputs, and cached until the position changes. """
+
+    def __init__(self, allow_scl):
+        self.logger = logging.getLogger(ct.LOGGER)
+        self.allow_scl = allow_scl
+
+        self.result = None
+        self.history = []
+        self.turn = twixt.Game.WHITE
+        self.pegbits = [0, 0]
+        self.linkbits = [0] * 8
+        self.occupied = 0
+        # links added by each move
+        self.link_history = []
+        self.connections = PegConnections(S)
+        self.paths = PotentialPaths()
+        self.patterns = None
+        self.zkey = 0
+        self.zkey_t = 0
+        self._arrays = None
+
+    def clone(self):
+
+        copy = BitboardGame(self.allow_scl)
+        copy.result = self.result
+        copy.history = list(self.history)
+        copy.turn = self.turn
+        copy.pegbits = list(self.pegbits)
+        copy.linkbits = list(self.linkbits)
+        copy.occupied = self.occupied
+        copy.link_history = list(self.link_history)
+        copy.connections = self.connections.clone()
+        copy.paths = self.paths.clone()
+        copy.patterns = (None if self.patterns is None
+                         else self.patterns.clone())
+        copy.zkey = self.zkey
+        copy.zkey_t = self.zkey_t
+        return copy
+
+    @property
+    def pegs(self):
+        return self._get_arrays()[0]
+
+    @property
+    def links(self):
+        return self._get_arrays()[1]
+
+    def _get_arrays(self):
+        if self._arrays is None:
+            self._arrays = (geo.bits_to_array(self.pegbits),
+                            geo.bits_to_array(self.linkbits))
+        return self._arrays
+
+    def is_winning(self, color):
+
+        return self.connections.winning[color]
+
+    def get_peg(self, point, color):
+
+        return (self.pegbits[color] >> geo.cell_of(point)) & 1
+
+    def peg_bits(self, color):
+
+        return self.pegbits[color]
+
+    def safe_get_peg(self, point, color):
+
+        if not twixt.Game.inbounds(point):
+            return 0
+        return self.get_peg(point, color)
+
+    def get_link(self, a, b, color):
+
+        ix1, (cx, cy) = self.get_link_index(a, b, color)
+        return (self.linkbits[ix1] >> (cx * S + cy)) & 1
+
+    def set_link(self, a, b, color, value):
+
+        ix1, (cx, cy) = self.get_link_index(a, b, color)
+        if value:
+            self.linkbits[ix1] |= 1 << (cx * S + cy)
+        else:
+            self.linkbits[ix1] &= ~(1 << (cx * S + cy))
+        self._arrays = None
+
+    def get_link_slot(self, slot, color):
+
+        plane, center = divmod(slot + color * geo.NCELLS, geo.NCELLS)
+        return (self.linkbits[plane] >> center) & 1
+
+    def any_crossing_links(self, a, b, color, value=None):
+
+        target = geo.cell_of(b)
+        for _, nb, _, _, crossing, _ in geo.NEIGHBOURS[geo.cell_of(a)]:
+            if nb == target:
+                return self._is_crossed(crossing, color)
+        return False
+
+    def _is_crossed(self, crossing, color):
+        links = self.linkbits
+        for geom, mask in crossing:
+            if links[geom + color] & mask:
+                return True
+        return False
+
+    def play_swap(self):
+
+        assert len(self.history) == 1
+        a = geo.cell_of(self.history[0])
+        b = geo.cell_of(self.history[0].flip())
+        self.pegbits[twixt.Game.WHITE] &= ~(1 << a)
+        self.pegbits[twixt.Game.BLACK] |= 1 << b
+        self.occupied = (self.occupied & ~(1 << a)) | (1 << b)
+        self.history.append(twixt.SWAP)
+        self.link_history.append(())
+        self.turn = twixt.Game.WHITE
+        self._toggle_peg_key(twixt.Game.WHITE, a)
+        self._toggle_peg_key(twixt.Game.BLACK, b)
+
+        self.connections.remove_peg()
+        self.connections.add_peg(twixt.Game.BLACK, b, [])
+        self.paths.remove_peg()
+        self.paths.add_peg(twixt.Game.BLACK, b, [], self.allow_scl)
+        if self.patterns is not None:
+            self.patterns.remove_peg()
+            self.patterns.add_peg(self, twixt.Game.BLACK, b)
+        self._arrays = None
+
+    def undo_swap(self):
+
+        assert len(self.history) == 2
+        a = geo.cell_of(self.history[0])
+        b = geo.cell_of(self.history[0].flip())
+        self.pegbits[twixt.Game.WHITE] |= 1 << a
+        self.pegbits[twixt.Game.BLACK] &= ~(1 << b)
+        self.occupied = (self.occupied & ~(1 << b)) | (1 << a)
+        self.history.pop()
+        self.link_history.pop()
+        self.turn = twixt.Game.BLACK
+        self._toggle_peg_key(twixt.Game.WHITE, a)
+        self._toggle_peg_key(twixt.Game.BLACK, b)
+
+        self.connections.remove_peg()
+        self.connections.add_peg(twixt.Game.WHITE, a, [])
+        self.paths.remove_peg()
+        self.paths.add_peg(twixt.Game.WHITE, a, [], self.allow_scl)
+        if self.patterns is not None:
+            self.patterns.remove_peg()
+            self.patterns.add_peg(self, twixt.Game.WHITE, a)
+        self._arrays = None
+
+    def play(self, move, check_draw=False):
+
+        if move == twixt.SWAP:
+            self.play_swap()
+            return
+
+        if type(move) == str:
+            move = Point(move)
+
+        assert twixt.Game.inbounds(move), (move)
+        cell = geo.cell_of(move)
+        bit = 1 << cell
+        assert not self.occupied & bit, (move, self.history)
+
+        turn = self.turn
+        if turn == twixt.Game.WHITE:
+            assert move.x != 0 and move.x != S - 1
+        else:
+            assert move.y != 0 and move.y != S - 1
+
+        own = self.pegbits[turn]
+        links = self.linkbits
+        added = []
+        linked = []
+        zkey = self.zkey ^ zobrist.PEG_KEYS[turn][cell]
+        zkey_t = self.zkey_t ^ zobrist.PEG_KEYS_T[turn][cell]
+        for _, nb, geom, lbit, crossing, slot in geo.NEIGHBOURS[cell]:
+            if not (own >> nb) & 1:
+                continue
+            if self._is_crossed(crossing, 1 - turn):
+                continue
+            if not self.allow_scl and self._is_crossed(crossing, turn):
+                continue
+            links[geom + turn] |= lbit
+            added.append((geom + turn, lbit))
+            slot += turn * geo.NCELLS
+            zkey ^= zobrist.LINK_KEYS[slot]
+            zkey_t ^= zobrist.LINK_KEYS_T[slot]
+            linked.append(nb)
+
+        self.pegbits[turn] = own | bit
+        self.occupied |= bit
+        self.zkey = zkey
+        self.zkey_t = zkey_t
+        self.history.append(move)
+        self.link_history.append(added)
+        self.connections.add_peg(turn, cell, linked)
+        self.paths.add_peg(turn, cell, added, self.allow_scl)
+        if self.patterns is not None:
+            self.patterns.add_peg(self, turn, cell)
+        self._arrays = None
+
+        self._flip_turn()
+
+        if self.paths.is_draw():
+            self.result = twixt.DRAW
+
+        # end play(self)
+
+    def undo(self, check_draw=False):
+
+        assert len(self.history) > 0
+        umove = self.history[-1]
+        if umove == twixt.SWAP:
+            self.undo_swap()
+            return
+
+        uturn = 1 - self.turn
+        bit = 1 << geo.cell_of(umove)
+        assert self.pegbits[uturn] & bit
+        self.pegbits[uturn] &= ~bit
+        self.occupied &= ~bit
+        self._toggle_peg_key(uturn, geo.cell_of(umove))
+        for plane, lbit in self.link_history.pop():
+            self.linkbits[plane] &= ~lbit
+            slot = plane * geo.NCELLS + lbit.bit_length() - 1
+            self.zkey ^= zobrist.LINK_KEYS[slot]
+            self.zkey_t ^= zobrist.LINK_KEYS_T[slot]
+
+        self.history.pop()
+        self.turn = uturn
+        self.connections.remove_peg()
+        self.paths.remove_peg()
+        if self.patterns is not None:
+            self.patterns.remove_peg()
+        if self.result == twixt.DRAW and not self.paths.is_draw():
+            self.result = None
+        self._arrays = None
+
+        # end undo
+
+
+def _random_positions(num_games, rng):
+    """ Move lists of random games, cut at random lengths """
+    positions = []
+    for _ in range(num_games):
+        game = BitboardGame(True)
+        moves = []
+        length = rng.randint(10, 120)
+        while len(moves) < length and not game.just_won():
+            cell = rng.randrange(geo.NCELLS)
+            p = geo.point_of(cell)
+            if (game.occupied >> cell) & 1:
+                continue
+            if not twixt.Game.inbounds_for_player(p, game.turn):
+                continue
+            game.play(p)
+            moves.append(p)
+        positions.append(moves)
+    return positions
+
+
+def compare_engines(num_games=50, tries=20, seed=0):
+    """ Measure play/undo pairs per second of both engines on the same
+        random positions, like the mcts does when visiting nodes. """
+    rng = random.Random(seed)
+    positions = _random_positions(num_games, rng)
+    replies = [[geo.point_of(rng.randrange(geo.NCELLS)) for _ in range(tries)]
+               for _ in positions]
+
+    results = {}
+    for name, cls in (("numpy", twixt.Game), ("bitboard", BitboardGame)):
+        count = 0
+        elapsed = 0.0
+        for moves, candidates in zip(positions, replies):
+            game = cls(False)
+            for m in moves:
+                game.play(m)
+            start = time.perf_counter()
+            for p in candidates:
+                if (not twixt.Game.inbounds_for_player(p, game.turn) or
+                        game.get_peg(p, 0) or game.get_peg(p, 1)):
+                    continue
+                game.play(p)
+                game.just_won()
+                game.undo()
+                count += 1
+            elapsed += time.perf_counter() - start
+        results[name] = count / elapsed
+    return results
+
+
+if __name__ == "__main__":
+    for engine, rate in compare_engines().items():
+        print("%-10s %10.0f play/undo per second" % (engine, rate))
@@ -1,4 +1,5 @@
 import backend.twixt as twixt
+import backend.geometry as geo
 import constants as ct
 from PySimpleGUI.PySimpleGUI import TEXT_LOCATION_BOTTOM_LEFT
 from backend.point import Point
@@ -102,10 +103,10 @@ class TwixtBoard:
         if visits is not None:
             nho.objects.append(self._create_visits_label(move, color, visits))
 
-        for dlink in game.DLINKS:
-            other = move + dlink
+        for nb, slot, _ in geo.LINK_SLOTS[geo.cell_of(move)]:
+            other = geo.point_of(nb)
             if other in self.known_moves:
-                if game.safe_get_link(move, other, color):
+                if game.get_link_slot(slot, color):
                     nho.objects.append(
                         self._create_drawn_link(move, other, color, visits))
 
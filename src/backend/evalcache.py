@@ -0,0 +1,70 @@
+import threading
+from collections import OrderedDict
+
+# rough size of an entry without its arrays: key tuple, list, dict slot
+ENTRY_OVERHEAD = 300
+
+
+class EvalCache:
+    """ Bounded LRU cache of network evaluations.
+
+        Maps a key to the list of arrays returned by the network and
+        evicts the least recently used entries once the arrays take more
+        than max_bytes. Safe to share between threads. """
+
+    def __init__(self, max_bytes):
+
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        """ Cached evaluation for key or None """
+        with self.lock:
+            value = self.entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value[0]
+
+    def put(self, key, arrays):
+        """ Cache arrays for key. The arrays are made read-only since
+            all consumers share them. """
+        size = ENTRY_OVERHEAD
+        for a in arrays:
+            a.setflags(write=False)
+            size += a.nbytes
+        if size > self.max_bytes:
+            return
+
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.nbytes -= old[1]
+            self.entries[key] = (arrays, size)
+            self.nbytes += size
+            while self.nbytes > self.max_bytes:
+                _, (_, evicted) = self.entries.popitem(last=False)
+                self.nbytes -= evicted
+
+    def clear(self):
+
+        with self.lock:
+            self.entries.clear()
+            self.nbytes = 0
+
+    def report(self):
+
+        total = self.hits + self.misses
+        rate = 100.0 * self.hits / total if total else 0.0
+        return "eval cache: %d entries, %.1f MB, %d hits, %d misses " \
+            "(%.1f%%)" % (len(self.entries), self.nbytes / 2**20,
+                          self.hits, self.misses, rate)
@@ -0,0 +1,205 @@
+import os
+import json
+import atexit
+import hashlib
+import logging
+import threading
+import numpy
+import constants as ct
+
+MAGIC = b"TWXEVAL1"
+HEADER_BYTES = 512
+# new evaluations are appended to the file in blocks of this many records
+FLUSH_RECORDS = 256
+# share of the size cap that is kept when the file is compacted
+COMPACT_RATIO = 0.75
+
+
+def model_fingerprint(folder):
+    """ Hash over names and contents of all files of a model folder """
+    h = hashlib.sha1()
+    for root, dirs, files in os.walk(folder):
+        dirs.sort()
+        for name in sorted(files):
+            p = os.path.join(root, name)
+            h.update(os.path.relpath(p, folder).encode())
+            with open(p, "rb") as f:
+                for chunk in iter(lambda: f.read(1 << 20), b""):
+                    h.update(chunk)
+    return h.hexdigest()
+
+
+def store_key(key):
+    """ Stable 64 bit hash of a naf.NetInputs cache key """
+    values = [key[0], key[1]]
+    if len(key) > 2:
+        for p in key[2]:
+            values += [p.x, p.y]
+    data = b"".join(int(v).to_bytes(8, "little") for v in values)
+    return int.from_bytes(
+        hashlib.blake2b(data, digest_size=8).digest(), "little")
+
+
+class EvalStore:
+    """ Evaluations of one model kept on disk across sessions.
+
+        The file is a header followed by fixed size records of a 64 bit
+        key, the value outputs and the move logits, both in float16. It
+        is memory-mapped for lookups and only ever appended to, in
+        blocks of FLUSH_RECORDS. Once it grows beyond max_bytes, it is
+        compacted to the records used in this session plus the newest
+        ones. The file name and header hold the model fingerprint, so a
+        different model never reads these evaluations. """
+
+    def __init__(self, folder, fingerprint, max_bytes, num_values,
+                 num_logits):
+
+        self.logger = logging.getLogger(ct.LOGGER)
+        self.path = os.path.join(folder, "evals_%s.bin" % fingerprint[:16])
+        self.max_bytes = max_bytes
+        self.dtype = numpy.dtype([("key", "<u8"),
+                                  ("value", "<f2", (num_values,)),
+                                  ("logits", "<f2", (num_logits,))])
+        info = json.dumps({"fingerprint": fingerprint,
+                           "values": num_values, "logits": num_logits})
+        self.header = (MAGIC + info.encode()).ljust(HEADER_BYTES)
+
+        self.records = None
+        self.count = 0
+        self.index = {}
+        self.inode = None
+        self.used = set()
+        self.pending = {}
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+        os.makedirs(folder, exist_ok=True)
+        if not self._header_matches():
+            with open(self.path, "wb") as f:
+                f.write(self.header)
+        self._map()
+        atexit.register(self.flush)
+
+    def _header_matches(self):
+        try:
+            with open(self.path, "rb") as f:
+                return f.read(HEADER_BYTES) == self.header
+        except OSError:
+            return False
+
+    def _map(self):
+        """ Map the file and index the records not indexed yet """
+        stat = os.stat(self.path)
+        count = (stat.st_size - HEADER_BYTES) // self.dtype.itemsize
+        if stat.st_ino != self.inode:
+            # new or compacted, maybe by another process
+            self.index = {}
+            self.used = set()
+            self.count = 0
+            self.inode = stat.st_ino
+        self._unmap()
+        if count == 0:
+            return
+        self.records = numpy.memmap(self.path, self.dtype, "r",
+                                    offset=HEADER_BYTES, shape=(count,))
+        keys = self.records["key"][self.count:].tolist()
+        self.index.update(zip(keys, range(self.count, count)))
+        self.count = count
+
+    def _unmap(self):
+        """ Close the map of the file, which Windows can't replace
+            while it is mapped """
+        if self.records is not None:
+            mm = self.records._mmap
+            self.records = None
+            mm.close()
+
+    def __len__(self):
+        return len(self.index) + len(self.pending)
+
+    def get(self, key):
+        """ Stored evaluation for a naf.NetInputs cache key, shaped like
+            the results of NNEvaluater.eval_one(), or None """
+        k = store_key(key)
+        with self.lock:
+            result = self.pending.get(k)
+            if result is not None:
+                self.hits += 1
+                return result
+            i = self.index.get(k)
+            if i is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.used.add(i)
+            record = self.records[i]
+            return [record["value"].astype(numpy.float32)[None],
+                    record["logits"].astype(numpy.float32)[None]]
+
+    def put(self, key, result):
+
+        k = store_key(key)
+        with self.lock:
+            if k in self.index:
+                return
+            self.pending[k] = result
+            if len(self.pending) >= FLUSH_RECORDS:
+                self._flush()
+
+    def flush(self):
+        """ Append all new evaluations to the file """
+        with self.lock:
+            self._flush()
+
+    def _flush(self):
+        if not self.pending:
+            return
+
+        block = numpy.zeros(len(self.pending), self.dtype)
+        block["key"] = list(self.pending.keys())
+        for i, (value, logits) in enumerate(self.pending.values()):
+            block["value"][i] = numpy.reshape(value, -1)
+            block["logits"][i] = numpy.reshape(logits, -1)
+        try:
+            with open(self.path, "ab") as f:
+                f.write(block.tobytes())
+        except OSError as e:
+            self.logger.error("cannot write %s: %s", self.path, e)
+            return
+        finally:
+            self.pending.clear()
+
+        self._map()
+        if os.path.getsize(self.path) > self.max_bytes:
+            self._compact()
+
+    def _compact(self):
+        keep = int(COMPACT_RATIO * (self.max_bytes - HEADER_BYTES) //
+                   self.dtype.itemsize)
+        # latest record of every key, used ones first, then the newest
+        latest = sorted(self.index.values())
+        used = [i for i in latest if i in self.used]
+        rest = [i for i in latest if i not in self.used]
+        newest = rest[max(len(rest) - (keep - len(used)), 0):]
+        chosen = sorted(used[:keep] + newest)
+        # where the used records end up in the compacted file
+        used = {j for j, i in enumerate(chosen) if i in self.used}
+
+        tmp = self.path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(self.header)
+            f.write(self.records[chosen].tobytes())
+        self._unmap()
+        os.replace(tmp, self.path)
+        self.logger.info("compacted %s to %d evaluations", self.path,
+                         len(chosen))
+        self._map()
+        self.used = used
+
+    def report(self):
+
+        total = self.hits + self.misses
+        rate = 100.0 * self.hits / total if total else 0.0
+        return "eval store: %d entries, %d hits, %d misses (%.1f%%)" % (
+            len(self), self.hits, self.misses, rate)
@@ -0,0 +1,228 @@
+#! /usr/bin/env python
+import pickle
+import logging
+from os import path
+import numpy
+
+import constants as ct
+from backend.point import Point
+
+# Board geometry shared by the position engines.
+#
+# Cells are numbered cell = x * SIZE + y, so bit <cell> of a python int
+# matches element [x, y] of the numpy planes used by twixt.Game. There are
+# eight link planes, indexed color + LINK_LONGY + LINK_DIFFSIGN, and a link
+# is stored at the cell of its center (see twixt.Game.get_link_index).
+
+SIZE = 24
+LINK_LONGY = 4
+LINK_DIFFSIGN = 2
+DLINKS = [(-2, -1), (-1, -2), (1, -2), (2, -1),
+          (2, 1), (1, 2), (-1, 2), (-2, 1)]
+
+# links crossing the link a->b, given as multiples of (dlong, dshort)
+# of both of their end points relative to a
+CROSS_LINKS = [
+    (-1, 1, 1, 0),
+    (0, 1, 2, 0),
+    (1, 1, 3, 0),
+
+    (0, 1, 1, -1),
+    (0, 2, 1, 0),
+    (1, 1, 2, -1),
+    (1, 2, 2, 0),
+
+    (0, -1, 1, 1),
+    (1, 0, 2, 2)
+]
+
+NCELLS = SIZE * SIZE
+NBYTES = (NCELLS + 7) // 8
+
+# the tables below are built once and pickled next to this file; bump
+# TABLES_VERSION whenever their layout changes
+TABLES_VERSION = 2
+TABLES_FILE = path.join(path.dirname(__file__), "geometry_%d.cache" % SIZE)
+
+
+def cell_of(p):
+    return int(p.x * SIZE + p.y)
+
+
+def point_of(cell):
+    return Point(*divmod(cell, SIZE))
+
+
+def mask(cells):
+    bits = 0
+    for x, y in cells:
+        bits |= 1 << (x * SIZE + y)
+    return bits
+
+
+def shift(bits, n):
+    return bits << n if n >= 0 else bits >> -n
+
+
+def bits_of(bits):
+    """ Yield the cells of the bits set in bits """
+    while bits:
+        low = bits & -bits
+        yield low.bit_length() - 1
+        bits ^= low
+
+
+def _inbounds(x, y):
+    return 0 <= x < SIZE and 0 <= y < SIZE
+
+
+def link_slot(ax, ay, bx, by):
+    """ link plane (without color) and center of the link a->b """
+    geom = 0
+    if (ax + bx) % 2 != 0:
+        geom += LINK_LONGY
+    if (by - ay) * (bx - ax) < 0:
+        geom += LINK_DIFFSIGN
+    return geom, (ax + bx) // 2, (ay + by) // 2
+
+
+def crossing_slots(dx, dy):
+    """ (geom, cx, cy) of the links crossing the link (0,0)->(dx,dy) """
+    sx, sy = (dx & 1) * dx, (dy & 1) * dy
+    lx, ly = (dx - sx) // 2, (dy - sy) // 2
+    slots = []
+    for cl in CROSS_LINKS:
+        cx, cy = lx * cl[0] + sx * cl[1], ly * cl[0] + sy * cl[1]
+        ex, ey = lx * cl[2] + sx * cl[3], ly * cl[2] + sy * cl[3]
+        slots.append(link_slot(cx, cy, ex, ey))
+    return slots
+
+
+def _build_neighbours():
+    """ For every cell, a tuple of (direction, neighbour, geom, link bit,
+        crossing, slot) per link direction that stays on the board.
+        crossing is a tuple of (geom, mask) pairs of the slots crossing
+        that link, slot is as in LINK_SLOTS. """
+    table = []
+    for x in range(SIZE):
+        for y in range(SIZE):
+            entries = []
+            for k, (dx, dy) in enumerate(DLINKS):
+                if not _inbounds(x + dx, y + dy):
+                    continue
+                geom, cx, cy = link_slot(x, y, x + dx, y + dy)
+                crossing = {}
+                for g, ox, oy in crossing_slots(dx, dy):
+                    if _inbounds(x + ox, y + oy):
+                        bit = 1 << ((x + ox) * SIZE + y + oy)
+                        crossing[g] = crossing.get(g, 0) | bit
+                entries.append((k, (x + dx) * SIZE + y + dy, geom,
+                                1 << (cx * SIZE + cy),
+                                tuple(sorted(crossing.items())),
+                                geom * NCELLS + cx * SIZE + cy))
+            table.append(tuple(entries))
+    return table
+
+
+def _build_directions():
+    """ Per link direction: cell shift and mask of the cells whose
+        neighbour in that direction is on the board """
+    table = []
+    for dx, dy in DLINKS:
+        valid = mask((x, y) for x in range(SIZE) for y in range(SIZE)
+                     if _inbounds(x + dx, y + dy))
+        table.append((dx * SIZE + dy, valid))
+    return table
+
+
+def _build_crossed(neighbours):
+    """ Per geom // 2 and link center, a tuple of (direction, mask) of
+        the links (cell, direction) crossed by a link in that slot """
+    crossed = [[dict() for _ in range(NCELLS)] for _ in range(4)]
+    for cell, entries in enumerate(neighbours):
+        for k, _, _, _, crossing, _ in entries:
+            for g, bits in crossing:
+                for center in bits_of(bits):
+                    edges = crossed[g // 2][center]
+                    edges[k] = edges.get(k, 0) | (1 << cell)
+    return [[tuple(sorted(edges.items())) for edges in plane]
+            for plane in crossed]
+
+
+def _build_link_slots():
+    """ For every cell, a tuple of (neighbour, slot, crossing) per link
+        direction that stays on the board. Slots are flat indices into
+        the (8, SIZE, SIZE) link planes for BLACK; add color * NCELLS to
+        get the slot of color. crossing holds the slots of the links
+        crossing that link. """
+    table = []
+    for x in range(SIZE):
+        for y in range(SIZE):
+            entries = []
+            for dx, dy in DLINKS:
+                if not _inbounds(x + dx, y + dy):
+                    continue
+                geom, cx, cy = link_slot(x, y, x + dx, y + dy)
+                crossing = []
+                for g, ox, oy in crossing_slots(dx, dy):
+                    if _inbounds(x + ox, y + oy):
+                        crossing.append(g * NCELLS + (x + ox) * SIZE + y + oy)
+                entries.append(((x + dx) * SIZE + y + dy,
+                                geom * NCELLS + cx * SIZE + cy,
+                                tuple(crossing)))
+            table.append(tuple(entries))
+    return table
+
+
+def _build_tables():
+    neighbours = _build_neighbours()
+    return (neighbours, _build_directions(), _build_crossed(neighbours),
+            _build_link_slots())
+
+
+def _load_tables():
+    """ Read the tables from TABLES_FILE, or build and save them if the
+        file is missing or stale """
+    logger = logging.getLogger(ct.LOGGER)
+    try:
+        with open(TABLES_FILE, "rb") as f:
+            version, tables = pickle.load(f)
+        if version == (TABLES_VERSION, SIZE, DLINKS, CROSS_LINKS):
+            return tables
+    except Exception:
+        pass
+
+    tables = _build_tables()
+    try:
+        with open(TABLES_FILE, "wb") as f:
+            pickle.dump(((TABLES_VERSION, SIZE, DLINKS, CROSS_LINKS), tables),
+                        f, pickle.HIGHEST_PROTOCOL)
+    except OSError as e:
+        logger.info("cannot cache board tables in %s: %s", TABLES_FILE, e)
+    return tables
+
+
+NEIGHBOURS, DIRECTIONS, CROSSED, LINK_SLOTS = _load_tables()
+
+# (cell a, cell b) -> (slot, crossing) of the link a->b
+LINK_OF = {(cell, nb): (slot, crossing)
+           for cell, entries in enumerate(LINK_SLOTS)
+           for nb, slot, crossing in entries}
+
+# cells a color may play on, its start and its end line
+PLAYABLE = [mask((x, y) for x in range(SIZE) for y in range(1, SIZE - 1)),
+            mask((x, y) for x in range(1, SIZE - 1) for y in range(SIZE))]
+START_LINE = [mask((0, y) for y in range(1, SIZE - 1)),
+              mask((x, 0) for x in range(1, SIZE - 1))]
+END_LINE = [mask((SIZE - 1, y) for y in range(1, SIZE - 1)),
+            mask((x, SIZE - 1) for x in range(1, SIZE - 1))]
+
+
+def bits_to_array(bits):
+    """ Convert a list of bitboards to an int8 array of shape
+        (len(bits), SIZE, SIZE). """
+    buf = b"".join(b.to_bytes(NBYTES, "little") for b in bits)
+    flat = numpy.unpackbits(numpy.frombuffer(buf, numpy.uint8),
+                            bitorder="little")
+    flat = flat.reshape(len(bits), NBYTES * 8)[:, :NCELLS]
+    return flat.reshape(len(bits), SIZE, SIZE).astype(numpy.int8)
@@ -15,6 +15,11 @@ class NetInputs:
 
     def __init__(self, thing):
         self.naf = numpy.zeros(self.NAF_DIMS, dtype=numpy.uint8)
+        # identifies the inputs for caching evaluations: the normalized
+        # position key, the rotation applied and, if the net uses them,
+        # the recent moves
+        self.key = thing.normalized_key()
+        self.rotation = 0
         self.init_from_game(thing)
 
     def init_from_game(self, game):
@@ -75,9 +80,8 @@ class NetInputs:
 
         tmp = numpy.flip(self.naf, 0)
 
-        S = twixt.Game.SIZE
         vix = twixt.Game.LINK_LONGY
-        self.naf = numpy.zeros((S, S, 11), dtype=numpy.uint8)
+        self.naf = numpy.zeros_like(tmp)
         self.naf[:, :, 10] = tmp[:, :, 10]
         for color in range(2):
             self.naf[:, :, 8 + color] = tmp[:, :, 8 + color]
@@ -98,9 +102,8 @@ class NetInputs:
 
         tmp = numpy.flip(self.naf, 1)
 
-        S = twixt.Game.SIZE
         vix = twixt.Game.LINK_LONGY
-        self.naf = numpy.zeros((S, S, 11), dtype=numpy.uint8)
+        self.naf = numpy.zeros_like(tmp)
         self.naf[:, :, 10] = tmp[:, :, 10]
 
         for color in range(2):
@@ -125,6 +128,29 @@ class NetInputs:
             self.hflip()
         if r & VFLIP_BIT:
             self.vflip()
+        # flips commute and undo themselves
+        self.rotation ^= r
+
+    def rotated(self, r):
+        """ Copy of these inputs with rotation r applied on top. The naf
+            is gathered in one step with a precomputed permutation. """
+        copy = NetInputs.__new__(NetInputs)
+        flat = numpy.concatenate((numpy.zeros(1, self.naf.dtype),
+                                  self.naf.reshape(-1)))
+        copy.naf = flat[NAF_PERMUTATIONS[r]]
+        copy.key = self.key
+        copy.rotation = self.rotation ^ r
+        S1 = twixt.Game.SIZE - 1
+        copy.recents = [twixt.Point(S1 - p.x if r & HFLIP_BIT else p.x,
+                                    S1 - p.y if r & VFLIP_BIT else p.y)
+                        for p in self.recents]
+        return copy
+
+    def cache_key(self, use_recents=False):
+
+        if use_recents:
+            return self.key, self.rotation, tuple(self.recents)
+        return self.key, self.rotation
 
     def to_input_arrays(self, use_recents=False):
 
@@ -191,6 +217,12 @@ def policy_index_point(thing, index):
         return twixt.Point(minor, major + 1)
 
 
+# policy_index_point() of both colors and all indices, for the hot loops
+POLICY_POINTS = [[policy_index_point(color, index)
+                  for index in range(twixt.Game.SIZE * (twixt.Game.SIZE - 2))]
+                 for color in (0, 1)]
+
+
 def policy_point_index(thing, point):
     if isinstance(thing, twixt.Game):
         color = thing.turn
@@ -262,6 +294,35 @@ def rotate_policy_array(pa, r):
     return x
 
 
+def _naf_permutation(r):
+    """ Source indices + 1 into the flattened naf for each element of
+        the naf with rotation r applied; 0 where the result is 0 """
+    nip = NetInputs.__new__(NetInputs)
+    nip.naf = numpy.arange(1, numpy.prod(NetInputs.NAF_DIMS) + 1)
+    nip.naf = nip.naf.reshape(NetInputs.NAF_DIMS)
+    nip.rotation = 0
+    nip.recents = []
+    nip.rotate(r)
+    return nip.naf.astype(numpy.intp)
+
+
+NAF_PERMUTATIONS = [_naf_permutation(r) for r in range(NUM_ROTATIONS)]
+
+# rotations are their own inverse, so these also undo them
+POLICY_PERMUTATIONS = [
+    rotate_policy_array(numpy.arange(twixt.Game.SIZE * (twixt.Game.SIZE - 2)),
+                        r) for r in range(NUM_ROTATIONS)]
+
+# all four symmetries, in the order the ensemble modes evaluate them
+ENSEMBLE_ROTATIONS = [0, HFLIP_BIT, HFLIP_BIT | VFLIP_BIT, VFLIP_BIT]
+
+
+def unrotate_policy_array(pa, r):
+    """ Policy array for the unrotated board from one evaluated with
+        rotation r """
+    return numpy.reshape(pa, -1)[POLICY_PERMUTATIONS[r]]
+
+
 def three_to_one(three):
     """ Take a three-vector of logits and return a score between -1 and 1 """
     lL, lD, lW = three
@@ -1,6 +1,11 @@
 import os
 import logging
+import threading
+import numpy
 import constants as ct
+import backend.naf as naf
+from backend.evalcache import EvalCache
+from backend.evalstore import EvalStore, model_fingerprint
 
 # Suppress Tensorflow info messages and warnings
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'
@@ -12,7 +17,10 @@ tf.disable_v2_behavior()
 
 class NNEvaluater:
 
-    def __init__(self, model):
+    # largest number of positions per session run
+    MAX_BATCH = 64
+
+    def __init__(self, model, cache_mb=0, store_mb=0, max_batch=MAX_BATCH):
 
         export_dir = os.path.join(os.getcwd(), model)
         self.logger = logging.getLogger(ct.LOGGER)
@@ -34,14 +42,99 @@ class NNEvaluater:
 
         self.use_recents = (int(self.locx_t.shape[3]) == 3)
 
+        # input buffers of a whole batch, filled in place for every run.
+        # Each thread gets its own, so that session runs of parallel
+        # MCTS workers overlap.
+        self.max_batch = max_batch
+        self.local = threading.local()
+
+        self.cache = EvalCache(cache_mb * 2**20) if cache_mb else None
+        self.store = None
+        if store_mb:
+            self.store = EvalStore(ct.EVAL_STORE_FOLDER,
+                                   model_fingerprint(export_dir),
+                                   store_mb * 2**20,
+                                   int(self.pwin_t.shape[-1]),
+                                   int(self.movelogits_t.shape[-1]))
+
+    def _buffer(self, tensor):
+        shape = [self.max_batch] + [int(d) for d in tensor.shape[1:]]
+        return numpy.zeros(shape, tensor.dtype.as_numpy_dtype)
+
+    def _buffers(self):
+        """ Input buffers of the calling thread """
+        local = self.local
+        if not hasattr(local, "pegx"):
+            local.pegx = self._buffer(self.pegx_t)
+            local.linkx = self._buffer(self.linkx_t)
+            local.locx = self._buffer(self.locx_t)
+            # without recents the location planes are the same for all
+            local.locx[:] = naf.location_inputs(
+                numpy.zeros(local.locx.shape[1:], local.locx.dtype))
+        return local.pegx, local.linkx, local.locx
+
     def eval_one(self, nip):
 
-        pegs, links, locs = nip.to_input_arrays(self.use_recents)
+        return self.eval_many([nip])[0]
+
+    def eval_many(self, nips):
+        """ Evaluate a list of NetInputs. Results come from the cache, the
+            store or from the net, which gets all others in batches of at
+            most max_batch. Returns a [pwin, movelogits] list per input,
+            each array with a batch dimension of 1 like eval_one(). """
+        results = [None] * len(nips)
+        keys = [None] * len(nips)
+        todo = []
+        for i, nip in enumerate(nips):
+            if self.cache is not None or self.store is not None:
+                keys[i] = nip.cache_key(self.use_recents)
+            results[i] = self._lookup(keys[i])
+            if results[i] is None:
+                todo.append(i)
+
+        for start in range(0, len(todo), self.max_batch):
+            batch = todo[start:start + self.max_batch]
+            pwin, movelogits = self._run([nips[i] for i in batch])
+            for j, i in enumerate(batch):
+                results[i] = [pwin[j:j + 1].copy(),
+                              movelogits[j:j + 1].copy()]
+                if self.cache is not None:
+                    self.cache.put(keys[i], results[i])
+                if self.store is not None:
+                    self.store.put(keys[i], results[i])
+        return results
+
+    def _lookup(self, key):
+        if key is None:
+            return None
+        if self.cache is not None:
+            result = self.cache.get(key)
+            if result is not None:
+                return result
+        if self.store is not None:
+            result = self.store.get(key)
+            if result is not None:
+                if self.cache is not None:
+                    self.cache.put(key, result)
+                return result
+        return None
+
+    def _run(self, nips):
+        """ One session run on the inputs, copied into the preallocated
+            batch buffers """
+        n = len(nips)
+        pegx, linkx, locx = self._buffers()
+        for i, nip in enumerate(nips):
+            pegs, links, locs = nip.to_input_arrays(self.use_recents)
+            pegx[i] = pegs
+            linkx[i] = links
+            if self.use_recents:
+                locx[i] = locs
 
         feed_dict = {
-            self.pegx_t: [pegs],
-            self.linkx_t: [links],
-            self.locx_t: [locs],
+            self.pegx_t: pegx[:n],
+            self.linkx_t: linkx[:n],
+            self.locx_t: locx[:n],
             self.is_training_t: None
         }
 
@@ -1,33 +1,140 @@
 #! /usr/bin/env python
 import math
+import time
 import numpy
 import logging
+import threading
+from collections import OrderedDict
 
+import backend.geometry as geo
 import backend.naf as naf
+import backend.patterns as patterns
+import backend.pnsearch as pnsearch
+import backend.tactics as tactics
 import backend.twixt as twixt
+from backend.arena import EdgeArena, EDGE_BYTES
 import constants as ct
 from backend.point import Point
 
 
-class EvalNode:
+# number of entries of a policy array
+POLICY_SIZE = twixt.Game.SIZE * (twixt.Game.SIZE - 2)
+NO_MOVES = numpy.zeros(0, numpy.int16)
+# memory of a node besides its edges: the object, the views into the
+# arena and its entries in the subnodes of its parent and the
+# transposition table
+NODE_BYTES = 1000
+# share of the memory budget a tree is pruned to
+PRUNE_RATIO = 0.75
 
-    def __init__(self):
 
-        k = twixt.Game.SIZE * (twixt.Game.SIZE - 2)
-        self.N = numpy.zeros(k)
-        self.Q = numpy.zeros(k)
-        self.P = numpy.zeros(k)
+class EvalNode:
+    """ Node of the search tree. Only the legal moves of its position
+        have an edge: moves holds their policy indices in ascending
+        order, N, Q, P and LM the statistics of the edges in the same
+        order. These arrays are views into an EdgeArena if one is
+        given. Subnodes are kept in a dict by edge, allocated with the
+        first one.
+
+        Nsum is the total of N. lead is the edge with the most visits
+        among those not proven, n1 its visits and n2 the most visits of
+        the others; smart root selection needs them. All are kept up to
+        date with every visit. """
+
+    __slots__ = ("moves", "N", "Q", "P", "LM", "proven", "score",
+                 "winning_edge", "drawing_edge", "subnodes", "VL",
+                 "Nsum", "lead", "n1", "n2")
+
+    def __init__(self, moves=NO_MOVES, arena=None):
+
+        k = len(moves)
+        if arena is not None and k:
+            arena.allocate(self, moves)
+        else:
+            self.moves = moves
+            self.N = numpy.zeros(k, numpy.float32)
+            self.Q = numpy.zeros(k, numpy.float32)
+            self.P = numpy.zeros(k, numpy.float32)
+            # edges that are not proven yet
+            self.LM = numpy.ones(k, numpy.bool_)
         self.proven = False
         self.score = None
-        self.winning_move = None
-        self.drawing_move = None
-        self.subnodes = [None] * k
+        # edges that are proven to win or to draw
+        self.winning_edge = None
+        self.drawing_edge = None
+        self.subnodes = None
+        # virtual losses of descents waiting for their leaf evaluation
+        self.VL = None
+        self.Nsum = 0
+        self.lead = 0
+        self.n1 = 0
+        self.n2 = 0
+
+    def rank(self):
+        """ Find leader and runner-up among the edges not proven from
+            scratch, after N was set or an edge was proven """
+        self.Nsum = float(self.N.sum())
+        live = numpy.flatnonzero(self.LM)
+        if not len(live):
+            self.lead, self.n1, self.n2 = 0, 0, 0
+            return
+        N = self.N[live]
+        j = int(N.argmax())
+        self.lead = int(live[j])
+        self.n1 = float(N[j])
+        self.n2 = float(numpy.delete(N, j).max()) if len(live) > 1 \
+            else self.n1
+
+    def count_visit(self, index):
+
+        self.N[index] += 1
+        self.Nsum += 1
+        n = float(self.N[index])
+        if index == self.lead:
+            self.n1 = n
+        elif n > self.n1:
+            self.lead, self.n1, self.n2 = int(index), n, self.n1
+        elif n > self.n2:
+            self.n2 = n
+
+    def subnode(self, index):
+
+        if self.subnodes is None:
+            return None
+        return self.subnodes.get(index)
+
+    def set_subnode(self, index, node):
+
+        if self.subnodes is None:
+            self.subnodes = {}
+        self.subnodes[index] = node
+
+    def edge(self, policy_index):
+        """ Edge of a policy index, None if the move is not legal """
+        i = int(numpy.searchsorted(self.moves, policy_index))
+        if i < len(self.moves) and self.moves[i] == policy_index:
+            return i
+        return None
+
+    def dense(self, values):
+        """ Edge values spread out to a policy array, 0 for illegal
+            moves """
+        a = numpy.zeros(POLICY_SIZE)
+        a[self.moves] = values
+        return a
 
 
 class NeuralMCTS:
 
+    # number of recent trees kept for positions the game may return to
+    MAX_TREES = 4
+
     def __init__(self, sap, **kwargs):
-        """ sap = score and policy function, takes a game as input """
+        """ sap = score and policy function, takes a game as input.
+            sap_many, if given, takes a list of games and returns a list
+            of scores and policies; it is needed for batch_size > 1.
+            With threads > 1, sap and sap_many are called from several
+            threads at once. """
         self.cpuct = kwargs.pop("cpuct", 1.0)
         self.add_noise = kwargs.pop("add_noise", 0.25)
         self.level = kwargs.pop("level", None)
@@ -35,6 +142,22 @@ class NeuralMCTS:
         self.smart_init = kwargs.pop("smart_init", 0)
         self.board = kwargs.pop("board", None)
         self.visualize_mcts = kwargs.pop("visualize_mcts", None)
+        self.transpositions = kwargs.pop("transpositions", False)
+        self.sap_many = kwargs.pop("sap_many", None)
+        self.batch_size = kwargs.pop("batch_size", 1)
+        self.threads = kwargs.pop("threads", 1)
+        # memory budget of the tree in MB, 0 is unlimited
+        self.tree_mb = kwargs.pop("tree_mb", 0)
+        # node budget of the proof-number solver at the root, 0 is off
+        self.solver_nodes = kwargs.pop("solver_nodes", 0)
+        # settle wins in one and restrict forced replies without the net
+        self.tactics = kwargs.pop("tactics", False)
+        # leave out all but one of the moves on dead cells
+        self.prune_dead = kwargs.pop("prune_dead", False)
+        # weight of the pattern prior mixed into the policy, 0 is off
+        self.pattern_prior = kwargs.pop("pattern_prior", 0)
+        # the net sees the recent moves (naf.NetInputs.NUM_RECENTS)
+        self.recents = kwargs.pop("recents", False)
 
         if kwargs:
             raise TypeError('Unexpected kwargs provided: %s' %
@@ -42,74 +165,331 @@ class NeuralMCTS:
         self.sap = sap
         self.root = None
         self.history_at_root = None
+        # transposition table: number of moves played -> position key ->
+        # node, so that move orders leading to the same position share
+        # one node
+        self.tt = {}
+        self.evals_saved = 0
+        # leaves the tactics settled or restricted in the current search
+        self.tactical_saves = 0
+        self.forced_leaves = 0
+        self.dead_pruned = 0
+        # recent roots by normalized position key, for undo, redo,
+        # cancel and swap
+        self.trees = OrderedDict()
+        # edge statistics of all nodes
+        self.arena = EdgeArena()
+        self.compacted_at = None
+        # nodes created since the arena was compacted or renewed
+        self.nodes = 0
+        self.solver = None
+        # position the solver last tried to settle
+        self.solved_key = None
         self.logger = logging.getLogger(ct.LOGGER)
 
+    def lookup_node(self, game):
+        """ Node of an earlier expanded transposition of the current game
+            state, or None """
+        if not self.transpositions or self.recents:
+            # with recent moves, the net tells move orders apart
+            return None
+        return self.tt.get(len(game.history), {}).get(game.position_key())
+
+    def store_node(self, game, node):
+
+        if self.transpositions and not self.recents:
+            self.tt.setdefault(len(game.history), {})[
+                game.position_key()] = node
+
+    def prune_tt(self, game):
+        """ Drop the nodes of positions before the current game state;
+            they can't be reached from the root any more """
+        if self.root is None:
+            self.tt = {}
+        else:
+            for ply in [p for p in self.tt if p < len(game.history)]:
+                del self.tt[ply]
+
+    def remember_tree(self, game):
+        """ Keep the tree of the root for when the game comes back to
+            its position. Trees are keyed by the position as the net
+            sees it, which doesn't change with a swap, since all edge
+            statistics are in that view. """
+        key = self.tree_key(game)
+        self.trees[key] = self.root
+        self.trees.move_to_end(key)
+        while len(self.trees) > self.MAX_TREES:
+            self.trees.popitem(last=False)
+
+    def tree_key(self, game):
+        """ Key of the tree of game in trees. When the net sees the
+            recent moves, other move orders are other positions """
+        if self.recents:
+            return (game.normalized_key(),
+                    tuple(game.history[-naf.NetInputs.NUM_RECENTS:]))
+        return game.normalized_key()
+
+    def renew_arena(self, game):
+        """ Free the edges of the nodes that neither the search nor the
+            recent trees can reach any more, once per move """
+        if self.root is None and not self.trees:
+            self.arena = EdgeArena()
+            self.nodes = 0
+        elif self.compacted_at != len(game.history):
+            self.compact()
+        self.compacted_at = len(game.history)
+
+    def compact(self):
+        """ Move the edges of the nodes reachable from the root and the
+            recent trees to a fresh chunk and drop all others """
+        nodes = []
+        seen = set()
+        stack = list(self.trees.values())
+        if self.root is not None:
+            stack.append(self.root)
+        while stack:
+            node = stack.pop()
+            if id(node) in seen:
+                continue
+            seen.add(id(node))
+            nodes.append(node)
+            if node.subnodes:
+                stack.extend(node.subnodes.values())
+        # transpositions off the new root are unreachable, too
+        for ply, table in self.tt.items():
+            self.tt[ply] = {key: node for key, node in table.items()
+                            if id(node) in seen}
+        self.arena.compact(nodes)
+        self.nodes = len(nodes)
+        self.logger.debug("arena compacted to %d nodes", len(nodes))
+
+    def tree_bytes(self):
+        """ Estimated memory of the tree: the edges handed out by the
+            arena and the nodes. The rest of the last chunk isn't
+            counted, its pages are only mapped once they are used """
+        return ((self.arena.edges - self.arena.free) * EDGE_BYTES +
+                self.nodes * NODE_BYTES)
+
+    def over_budget(self):
+
+        return (self.tree_mb > 0 and
+                self.tree_bytes() > self.tree_mb * 2**20)
+
+    def prune_tree(self):
+        """ Shrink the tree to PRUNE_RATIO of its memory budget: drop
+            the recent trees other than the root, then the subtrees
+            below the edges with the fewest visits, doubling the visits
+            a subtree needs to be kept until the tree is small enough.
+            The edges keep their statistics, a subtree that is visited
+            again is evaluated anew. Returns False if the tree is still
+            too big with the root alone. """
+        target = PRUNE_RATIO * self.tree_mb * 2**20
+        before = self.tree_bytes()
+        for key in [k for k, t in self.trees.items() if t is not self.root]:
+            del self.trees[key]
+        least = 1
+        while True:
+            self.compact()
+            if self.tree_bytes() <= target:
+                break
+            if least > self.root.Nsum:
+                return False
+            least *= 2
+            stack = [self.root]
+            seen = set()
+            while stack:
+                node = stack.pop()
+                if id(node) in seen or not node.subnodes:
+                    continue
+                seen.add(id(node))
+                for index in list(node.subnodes):
+                    if node.N[index] < least:
+                        del node.subnodes[index]
+                    else:
+                        stack.append(node.subnodes[index])
+        self.logger.info("tree pruned from %.1f MB to %.1f MB, subtrees "
+                         "with less than %d visits dropped",
+                         before / 2**20, self.tree_bytes() / 2**20, least)
+        return True
+
     def expand_leaf(self, game):
         """ Create a brand new leaf node for the current game state
             and return it. """
 
-        leaf = EvalNode()
+        leaf = self.create_leaf(game)
+        if leaf.score is None:
+            poseval, movelogits = self.sap(game)
+            self.evaluate_leaf(leaf, poseval, movelogits)
+        return leaf
+
+    def create_leaf(self, game):
+        """ Create a leaf node for the current game state. Its score is
+            None until evaluate_leaf() is called, unless the game is
+            over or, with tactics, decided in one move. """
 
+        self.nodes += 1
         if game.just_won():
+            # no moves left to search
+            leaf = EvalNode()
             leaf.proven = True
             leaf.score = -1
-            leaf.LMnz = "just_won"
             return leaf
 
-        leaf.LM = naf.legal_move_policy_array(game)
-        leaf.LMnz = leaf.LM.nonzero()
+        legal = naf.legal_move_policy_array(game)
+        if self.tactics:
+            leaf = self.tactical_leaf(game, legal)
+            if leaf is not None:
+                return leaf
+        if self.prune_dead:
+            self.prune_dead_cells(game, legal)
+        moves = legal.nonzero()[0]
+        leaf = EvalNode(moves, self.arena)
 
         if not leaf.LM.any():
-            # assert False
+            # assert False: just drew
             leaf.proven = True
             leaf.score = 0
-            leaf.LMnz = "just_drew"
             return leaf
 
-        ####
+        if self.pattern_prior:
+            # the net's policy is mixed in by evaluate_leaf()
+            leaf.P[:] = game.patterns.prior(game.turn, moves)
+        return leaf
+
+    def prune_dead_cells(self, game, legal):
+        """ Take the moves on dead cells but one out of legal. They
+            all pass, so one is enough, in case passing is best """
+        dead = (game.paths.dead_cells(game.allow_scl) &
+                tactics.free_cells(game, game.turn))
+        indices = [naf.policy_point_index(game.turn, geo.point_of(cell))
+                   for cell in geo.bits_of(dead)]
+        # keep a move that is still legal, so that legal never empties
+        indices = [index for index in indices if legal[index]]
+        for index in indices[1:]:
+            legal[index] = 0
+            self.dead_pruned += 1
+
+    def tactical_leaf(self, game, legal):
+        """ Leaf settled by a win in one of the player to move or by a
+            win in one of the opponent that can't be stopped, None
+            otherwise. If the opponent's wins can be stopped, only the
+            moves that stop them stay in legal. """
+
+        wins = tactics.winning_cells(game, game.turn)
+        zone = None if wins else tactics.must_play(game)
+        if zone is None and not wins:
+            return None
+        if zone:
+            # all other moves lose at once
+            keep = numpy.zeros_like(legal)
+            for cell in geo.bits_of(zone):
+                keep[naf.policy_point_index(
+                    game.turn, geo.point_of(cell))] = 1
+            if (legal * keep).any():
+                legal *= keep
+                self.forced_leaves += 1
+                return None
+            # none of the moves that stop the wins is legal
+
+        # settled without the net; the leaf keeps all moves in case it
+        # becomes a root
+        self.tactical_saves += 1
+        leaf = EvalNode(legal.nonzero()[0], self.arena)
+        leaf.P[:] = 1 / len(leaf.P)
+        leaf.proven = True
+        if wins:
+            index = leaf.edge(naf.policy_point_index(
+                game.turn, geo.point_of(wins[0])))
+            leaf.Q[index] = 1
+            leaf.LM[index] = 0
+            leaf.winning_edge = index
+            leaf.score = 1
+        else:
+            leaf.score = -1
+        return leaf
+
+    def evaluate_leaf(self, leaf, poseval, movelogits):
+        """ Set score and move probabilities of a leaf from the net.
+            With pattern_prior, leaf.P holds the pattern prior """
 
-        poseval, movelogits = self.sap(game)
         leaf.score = poseval
         if self.smart_init:
             leaf.Q[:] = poseval
-        maxlogit = movelogits[leaf.LMnz].max()
-        el = numpy.exp(movelogits - maxlogit)
-        divisor = el[leaf.LMnz].sum()
-        leaf.P = el / divisor
-        # stevens68: set P to 0 for non-legal moves. Otherwise
-        # illegal move might become best move in upcoming draws (move #100+)
-        leaf.P[numpy.where(leaf.LM == 0)[0]] = 0
-        # leaf.P *= leaf.LM
-
-        self.logger.debug("LMnz: %s", leaf.LMnz)
+        # softmax over the legal moves only; illegal moves have no edge
+        logits = numpy.reshape(movelogits, -1)[leaf.moves]
+        el = numpy.exp(logits - logits.max())
+        if self.pattern_prior:
+            leaf.P *= self.pattern_prior
+            leaf.P += (1.0 - self.pattern_prior) * el / el.sum()
+        else:
+            leaf.P[:] = el / el.sum()
+
+        self.logger.debug("moves: %s", leaf.moves)
         self.logger.debug("raw P: %s", leaf.P)
 
         if self.add_noise:
-            leaf.P[leaf.LMnz] *= (1.0 - self.add_noise)
-            leaf.P[leaf.LMnz] += self.add_noise * \
-                numpy.random.dirichlet(0.03 * numpy.ones(len(leaf.LMnz[0])))
+            leaf.P *= (1.0 - self.add_noise)
+            leaf.P += self.add_noise * \
+                numpy.random.dirichlet(0.03 * numpy.ones(len(leaf.P)))
 
         self.logger.debug("after noise P: %s", leaf.P)
-        return leaf
-        # end expand_leaf()
+        # end evaluate_leaf()
 
-    def visit_node(self, game, node, top=False, trials=None):
-        """ Visit a node, return the evaluation from the
-            point of view of the player currently to play. """
+    def visit(self, game, trials):
+        """ One visit from the root, without recursion: select moves
+            down to a leaf, evaluate it and back up the path """
 
-        assert not game.just_won()
-        if not node.LM.any():
-            self.proven = True
-            if node.drawing_move:
-                self.score = 0
-            else:
-                # all moves lose.  very sad.
-                self.score = -1
-            return self.score
+        path, leaf, score, evaluate = self.descend(game, trials)
+        if path:
+            node, index, move = path[0]
+            self.logger.debug("selecting index=%d move=%s Q=%.3f P=%.5f N=%d",
+                              index, str(move), node.Q[index],
+                              node.P[index], node.N[index])
+        if evaluate:
+            poseval, movelogits = self.sap(game)
+            self.evaluate_leaf(leaf, poseval, movelogits)
+        for _ in path:
+            game.undo()
+        self.backup_descent((path, leaf, score, None))
+
+    def backup_edge(self, node, index, subnode, subscore):
+        """ Count a visit of the edge to subnode with the score subscore
+            from the point of view of the player to play at node """
+
+        node.count_visit(index)
+        if subnode.proven:
+            node.Q[index] = subscore
+            node.LM[index] = 0
+            node.rank()
+            if subscore == 1:
+                node.proven = True
+                node.score = 1
+                node.winning_edge = index
+            elif subscore == 0:
+                node.drawing_edge = index
+        else:
+            node.Q[index] += (subscore - node.Q[index]) / node.N[index]
+
+    def ucb(self, node):
+        """ Upper confidence bounds of the moves at node. Pending visits
+            of a batch count as losses (virtual loss), so that the other
+            descents of the batch spread out. """
+
+        N, Q = node.N, node.Q
+        nsum = node.Nsum
+        if node.VL is not None:
+            N = node.N + node.VL
+            Q = numpy.where(N > 0, (node.Q * node.N - node.VL) /
+                            numpy.maximum(N, 1), node.Q)
+            nsum += float(node.VL.sum())
+        stv = math.sqrt(nsum + 1.0)
+        return Q + self.cpuct * node.P * stv / (1.0 + N)
+
+    def select_index(self, node, top, trials):
+        """ Index of the move to visit next at node """
 
         if top and self.smart_root:
-            vnz = node.N[node.LMnz]
-            maxn = vnz.max()
+            maxn = node.n1
             winnables = (node.N > maxn - trials) & node.LM
             num_winnables = numpy.count_nonzero(winnables)
             assert num_winnables > 0, (maxn, trials, numpy.array_str(
@@ -117,17 +497,11 @@ class NeuralMCTS:
             if num_winnables == 1:
                 index = winnables.argmax()
             else:
-                maxes = (node.N == maxn)
-                num_maxes = numpy.count_nonzero(maxes)
-                assert num_maxes > 0
-                if (num_maxes == 1 and
-                        maxn - vnz[numpy.argsort(vnz)[-2:]][0] > 1):
+                if maxn - node.n2 > 1:
                     # visit diff to second best is >1
-                    winnables[maxes.argmax()] = 0
+                    winnables[node.lead] = 0
 
-                nsum = node.N.sum()  # don't need to filter since all are 0
-                stv = math.sqrt(nsum + 1.0)
-                U = node.Q + self.cpuct * node.P * stv / (1.0 + node.N)
+                U = self.ucb(node)
 
                 wnz = numpy.nonzero(winnables)
                 nz_index = U[wnz].argmax()
@@ -135,49 +509,238 @@ class NeuralMCTS:
         else:
             # At least one node worth visiting.  Figure out which one to
             # visit...
-            nsum = node.N.sum()  # don't need to filter since all are 0
-            stv = math.sqrt(nsum + 1.0)
-            U = node.Q + self.cpuct * node.P * stv / (1.0 + node.N)
+            U = self.ucb(node)
 
-            nz_index = U[node.LMnz].argmax()
-            index = node.LMnz[0][nz_index]
+            index = numpy.where(node.LM, U, -numpy.inf).argmax()
 
-        move = naf.policy_index_point(game.turn, index)
+        return index
 
-        if top:
-            self.logger.debug("selecting index=%d move=%s Q=%.3f P=%.5f N=%d",
-                              index, str(move), node.Q[index],
-                              node.P[index], node.N[index])
+    def visit_batch(self, game, count, trials):
+        """ Descend up to count times from the root with virtual loss,
+            evaluate all new leaves with one call of sap_many and back up
+            every descent. Stops early when a descent reaches a leaf
+            that is already waiting for its evaluation. Returns the
+            number of visits done. """
 
-        subnode = node.subnodes[index]
+        descents = []
+        waiting = []
+        for i in range(count):
+            descent = self.collect_leaf(game, trials - i)
+            if descent is None:
+                break
+            descents.append(descent)
+            path, leaf, _, leaf_game = descent
+            if leaf_game is not None:
+                waiting.append((leaf, leaf_game))
+            self.add_virtual_loss(path)
+
+        if waiting:
+            results = self.sap_many([g for _, g in waiting])
+            for (leaf, _), (poseval, movelogits) in zip(waiting, results):
+                self.evaluate_leaf(leaf, poseval, movelogits)
+
+        for descent in descents:
+            self.backup_descent(descent)
+        return len(descents)
+
+    def add_virtual_loss(self, path):
+
+        for node, index, _ in path:
+            if node.VL is None:
+                node.VL = numpy.zeros(len(node.N), numpy.float32)
+            node.VL[index] += 1
+
+    def backup_descent(self, descent):
+        """ Back up a descent once its leaf is evaluated and take back
+            its virtual loss, if any """
+
+        path, leaf, score, _ = descent
+        if score is None:
+            score = leaf.score
+        for node, index, _ in reversed(path):
+            if node.VL is not None:
+                node.VL[index] -= 1
+                if not node.VL.any():
+                    node.VL = None
+            score = -score
+            self.backup_edge(node, index, node.subnode(index), score)
+
+    def search_parallel(self, game, trials, window, event, path,
+                        start=None, seconds=None):
+        """ Tree-parallel search: self.threads workers share the tree,
+            each on its own copy of the game. The tree is only touched
+            under one lock, which a worker releases while the net
+            evaluates its leaves; that's where the time goes and where
+            TensorFlow releases the GIL. Virtual loss keeps the workers
+            on different leaves. """
+
+        cond = threading.Condition()
+        state = {"started": 0, "done": 0, "error": None, "full": False}
+
+        def stopped():
+            return (state["started"] >= trials or self.root.proven or
+                    state["error"] is not None or state["full"] or
+                    (event is not None and event.is_set()) or
+                    self.out_of_time(start, seconds, state["done"]))
+
+        def worker(replica):
+            count = self.batch_size if self.sap_many is not None else 1
+            with cond:
+                while not stopped():
+                    if self.over_budget():
+                        if state["started"] > state["done"]:
+                            # prune once the descents in flight are
+                            # backed up
+                            cond.wait()
+                        elif not self.prune_tree():
+                            self.logger.warning(ct.MSG_TREE_FULL)
+                            state["full"] = True
+                            cond.notify_all()
+                        continue
+                    descents = []
+                    waiting = []
+                    while (len(descents) < count and
+                           state["started"] < trials):
+                        descent = self.collect_leaf(
+                            replica, trials - state["started"])
+                        if descent is None:
+                            break
+                        state["started"] += 1
+                        descents.append(descent)
+                        if descent[3] is not None:
+                            waiting.append((descent[1], descent[3]))
+                        self.add_virtual_loss(descent[0])
+
+                    if not descents:
+                        # all leaves in reach wait for another worker
+                        cond.wait()
+                        continue
+
+                    if waiting:
+                        games = [g for _, g in waiting]
+                        cond.release()
+                        try:
+                            if self.sap_many is not None:
+                                results = self.sap_many(games)
+                            else:
+                                results = [self.sap(games[0])]
+                        except Exception as e:
+                            results = None
+                            error = e
+                        finally:
+                            cond.acquire()
+                        if results is None:
+                            state["error"] = error
+                            cond.notify_all()
+                            return
+                        for (leaf, _), (poseval, movelogits) in zip(
+                                waiting, results):
+                            self.evaluate_leaf(leaf, poseval, movelogits)
+
+                    for descent in descents:
+                        self.backup_descent(descent)
+                    done = state["done"]
+                    state["done"] += len(descents)
+                    cond.notify_all()
+
+                    chunks = state["done"] // ct.MCTS_TRIAL_CHUNK
+                    if chunks > done // ct.MCTS_TRIAL_CHUNK:
+                        resp = self.progress_response(
+                            game, trials, state["done"], start, seconds)
+                        self.send_message(window, resp)
+                        if self.visualize_mcts:
+                            self.clean_path(path)
+                            self.traverse(replica, path, 0, self.root)
+
+        workers = [threading.Thread(target=worker, args=(game.clone(),),
+                                    daemon=True)
+                   for _ in range(self.threads)]
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join()
+        if state["error"] is not None:
+            raise state["error"]
+
+    def collect_leaf(self, game, trials):
+        """ Descend for a batch. Returns the path of (node, index, move),
+            the last node, its score if known without the net and, if
+            the net must evaluate the leaf, a copy of the game at the
+            leaf. Returns None if the leaf is already waiting for an
+            evaluation. """
+
+        path, node, score, evaluate = self.descend(game, trials)
+        leaf_game = game.clone() if evaluate else None
+        for _ in path:
+            game.undo()
+        if node is None:
+            return None
+        return path, node, score, leaf_game
+
+    def descend(self, game, trials):
+        """ Select moves from the root down to a new leaf, a proven
+            node or a node without moves left and play them on game.
+            Returns the path of (node, index, move), the last node, its
+            score if known without the net and whether the net must
+            evaluate it. The last node is None if it is a leaf that is
+            already waiting for an evaluation. """
+
+        node = self.root
+        path = []
+        score = None
+        evaluate = False
+        while True:
+            if not node.LM.any():
+                # all moves are proven: it's a draw if one of them
+                # draws, otherwise all moves lose.  very sad.
+                score = 0 if node.drawing_edge is not None else -1
+                break
 
-        game.play(move)
+            index = self.select_index(node, not path, trials)
+            move = naf.POLICY_POINTS[game.turn][node.moves[index]]
+            path.append((node, index, move))
+            game.play(move)
 
-        if subnode:
-            subscore = -self.visit_node(game, subnode)
-        else:
-            subnode = self.expand_leaf(game)
-            node.subnodes[index] = subnode
-            subscore = -subnode.score
+            subnode = node.subnode(index)
+            if subnode is None:
+                subnode = self.lookup_node(game)
+                if subnode is None:
+                    subnode = self.create_leaf(game)
+                    self.store_node(game, subnode)
+                    evaluate = subnode.score is None
+                elif subnode.score is not None:
+                    # reached by another move order before. Back up its
+                    # evaluation like a new leaf; later visits of this
+                    # edge descend into the shared node, while N and Q
+                    # stay per edge in each parent.
+                    self.evals_saved += 1
+                node.set_subnode(index, subnode)
+                if subnode.score is None and not evaluate:
+                    subnode = None
+                node = subnode
+                break
+            if subnode.score is None:
+                node = None
+                break
+            node = subnode
+            if node.proven:
+                break
 
-        game.undo()
+        return path, node, score, evaluate
 
-        node.N[index] += 1
-        if subnode.proven:
-            node.Q[index] = subscore
-            node.LM[index] = 0
-            node.LMnz = node.LM.nonzero()
-            if subscore == 1:
-                node.proven = True
-                node.winning_move = move
-            elif subscore == 0:
-                node.drawing_move = move
-        else:
-            node.Q[index] += (subscore - node.Q[index]) / node.N[index]
+    def compute_root(self, game):
+        """ Find the root for game: below the last root if game went on
+            from there, else a recent tree of the same position """
 
-        return subscore
+        self.follow_root(game)
+        if self.root is None:
+            self.root = self.trees.get(self.tree_key(game))
+            if self.root is not None:
+                self.logger.debug("reusing tree with %d visits",
+                                  self.root.Nsum)
+                self.history_at_root = list(game.history)
 
-    def compute_root(self, game):
+    def follow_root(self, game):
 
         if not self.history_at_root:
             self.root = None
@@ -201,15 +764,18 @@ class NeuralMCTS:
                 self.root = None
                 return
             color = (game.turn + len(game.history) - i) % 2
-            index = naf.policy_point_index(color, move)
-            self.root = self.root.subnodes[index]
+            index = self.root.edge(naf.policy_point_index(color, move))
+            self.root = (None if index is None
+                         else self.root.subnode(index))
             self.history_at_root.append(move)
+            i += 1
 
-        # finish compute_root
+        # finish follow_root
 
     def top_moves_str(self, game):
-        indices = numpy.argsort(self.root.P[self.root.LMnz])
-        pts = [str(naf.policy_index_point(game, self.root.LMnz[0][index]))
+        live = self.root.moves[self.root.LM]
+        indices = numpy.argsort(self.root.P[self.root.LM])
+        pts = [str(naf.policy_index_point(game, live[index]))
                for index in indices[-3:]]
 
         return ":" + ",".join(pts)
@@ -224,18 +790,21 @@ class NeuralMCTS:
         # if q == 0.0 => set new p to avg
         # if q == 0.5 => set new p to p (no change)
         # if q == 1.0 => set new p[0] to 1, p[n>0] = 0 (greedy)
-        prob = [(-4*p+2*avg)*q*q + (4*p-3*avg)*q + avg for p in prob[1:]]
-        prob[0] = (-4*p0+2*avg+2)*q*q + (4*p0-3*avg-1)*q + avg
-        return prob
+        rest = [(-4*p+2*avg)*q*q + (4*p-3*avg)*q + avg for p in prob[1:]]
+        return [(-4*p0+2*avg+2)*q*q + (4*p0-3*avg-1)*q + avg] + rest
 
     def eval_game(self, game, maxbest=twixt.MAXBEST):
 
+        self.track_patterns(game)
         self.compute_root(game)
-        # assert self.root == None
-        self.root = self.expand_leaf(game)
-        top_ixs = numpy.argsort(self.root.P)[-maxbest:]
+        if self.root is None:
+            self.root = self.expand_leaf(game)
+            self.store_node(game, self.root)
+            self.history_at_root = list(game.history)
+        rootP = self.root.dense(self.root.P)
+        top_ixs = numpy.argsort(rootP)[-maxbest:]
         moves = [naf.policy_index_point(game, ix) for ix in top_ixs][::-1]
-        P = [self.root.P[ix] for ix in top_ixs][::-1]
+        P = [rootP[ix] for ix in top_ixs][::-1]
         # scew P
         Pscew = self._scew(P)
 
@@ -243,15 +812,16 @@ class NeuralMCTS:
         return self.root.score, moves, P, Pscew
 
     def proven_result(self, game):
-        if self.root.winning_move:
+        moves = naf.POLICY_POINTS[game.turn]
+        if self.root.winning_edge is not None:
             self.report = "fwin" + self.top_moves_str(game)
-            return self.root.winning_move
-        elif self.root.drawing_move:
+            return moves[self.root.moves[self.root.winning_edge]]
+        elif self.root.drawing_edge is not None:
             self.report = "fdraw"
-            return self.root.drawing_move
+            return moves[self.root.moves[self.root.drawing_edge]]
         else:
             self.report = "flose"
-            return game.RESIGN
+            return twixt.RESIGN
 
     def create_response(self, game, status,
                         num_trials=0, current_trials=0,
@@ -275,11 +845,15 @@ class NeuralMCTS:
             resp["Pscew"] = [1.0]
 
         if not moves:
-            indices = numpy.argsort(self.root.N)[::-1][:game.MAXBEST]
-            resp["moves"] = [naf.policy_index_point(
-                game.turn, i) for i in indices]
-            resp["Y"] = [int(n) for n in self.root.N[indices].tolist()]
-            resp["P"] = [p for p in self.root.P[indices].tolist()]
+            # ties, as among the unvisited moves, go to the policy. Only
+            # the edges of the root are candidates, the tactics may have
+            # left out some legal moves
+            edges = numpy.lexsort(
+                (self.root.P, self.root.N))[::-1][:twixt.MAXBEST]
+            resp["moves"] = [naf.POLICY_POINTS[game.turn][i]
+                             for i in self.root.moves[edges]]
+            resp["Y"] = [int(n) for n in self.root.N[edges].tolist()]
+            resp["P"] = [float(p) for p in self.root.P[edges].tolist()]
             resp["Pscew"] = self._scew(resp["P"])
             # resp["Q"] = self.root.Q[indices].tolist()
         else:
@@ -287,50 +861,133 @@ class NeuralMCTS:
 
         return resp
 
+    def progress_response(self, game, trials, current, start, seconds):
+        """ Response of a search in progress, with the time used so far
+            if the search has a time budget """
+        resp = self.create_response(game, "in-progress", trials, current,
+                                    False)
+        if seconds is not None:
+            resp["seconds"] = seconds
+            resp["elapsed"] = time.time() - start
+        resp["tree_mb"] = self.tree_bytes() / 2**20
+        return resp
+
+    def out_of_time(self, start, seconds, trials):
+        """ Whether a search with a budget of seconds that started at
+            start and has done trials so far must stop: the time is up
+            or the leading move can't be caught up in the time left at
+            the speed so far """
+        if seconds is None:
+            return False
+        elapsed = time.time() - start
+        if elapsed >= seconds:
+            return True
+        if trials < ct.MCTS_TRIAL_CHUNK:
+            # too few trials to tell the speed
+            return False
+        left = trials * (seconds - elapsed) / elapsed
+        return self.root.n1 - self.root.n2 > left
+
     def send_message(self, window, response):
-        window.write_event_value('THREAD', response)
+        if window is not None:
+            window.write_event_value('THREAD', response)
 
-    def mcts(self, game, trials, window, event):
-        """ Using the neural net, compute the move visit count vector """
+    def root_visits(self, game):
+        """ Visits a search of game would start from """
+        self.compute_root(game)
+        return 0 if self.root is None else int(self.root.Nsum)
 
+    def mcts(self, game, trials, window, event, seconds=None):
+        """ Using the neural net, compute the move visit count vector.
+            With a budget of seconds, the search stops at whichever of
+            trials and seconds runs out first """
+
+        start = time.time()
+        self.track_patterns(game)
         self.compute_root(game)
+        self.prune_tt(game)
+        self.renew_arena(game)
+        self.evals_saved = 0
+        self.tactical_saves = 0
+        self.forced_leaves = 0
+        self.dead_pruned = 0
         if self.root is None:
             self.root = self.expand_leaf(game)
+            self.store_node(game, self.root)
             self.history_at_root = list(game.history)
-            top_ixs = numpy.argsort(self.root.P)[-5:]
+            rootP = self.root.dense(self.root.P)
+            top_ixs = numpy.argsort(rootP)[-5:]
             if self.logger.level <= logging.INFO:
                 # if... to avoid unnecessary conversion
                 msg = f'eval={self.root.score:.3f} '
                 for ix in top_ixs:
                     msg += (f'{naf.policy_index_point(game, ix)}: '
-                            f'{int(self.root.P[ix] * 10000 + 0.5)}')
+                            f'{int(rootP[ix] * 10000 + 0.5)}')
                 self.logger.info(msg)
 
+        if self.solver_nodes and not self.root.proven:
+            self.solve_root(game, event)
+
         if not self.root.proven:
             # for i in tqdm(range(trials), ncols=100, desc="processing",
             # file=sys.stdout):
             path = []
-            for i in range(trials):
-                assert not self.root.proven
-                self.visit_node(game, self.root, True,
-                                trials - i)
+            batched = self.batch_size > 1 and self.sap_many is not None
+            if self.threads > 1:
+                self.search_parallel(game, trials, window, event, path,
+                                     start, seconds)
+            else:
+                i = 0
+                while i < trials:
+                    assert not self.root.proven
+                    if self.over_budget() and not self.prune_tree():
+                        self.logger.warning(ct.MSG_TREE_FULL)
+                        break
+                    if batched:
+                        done = self.visit_batch(
+                            game, min(self.batch_size, trials - i), trials - i)
+                    else:
+                        self.visit(game, trials - i)
+                        done = 1
+                    i += done
+
+                    if self.root.proven:
+                        break
+
+                    if event is not None and event.is_set():
+                        break
+
+                    if self.out_of_time(start, seconds, i):
+                        break
+
+                    if (i // ct.MCTS_TRIAL_CHUNK >
+                            (i - done) // ct.MCTS_TRIAL_CHUNK):
+                        resp = self.progress_response(
+                            game, trials, i, start, seconds)
+                        self.send_message(window, resp)
+                        if self.visualize_mcts:
+                            self.clean_path(path)
+                            self.traverse(game, path, 0, self.root)
 
-                if self.root.proven:
-                    break
+        if self.visualize_mcts:
+            self.clean_path(path)
 
-                if event is not None and event.is_set():
-                    break
+        self.remember_tree(game)
+        self.logger.info("tree: %d nodes, %.1f MB", self.nodes,
+                         self.tree_bytes() / 2**20)
 
-                if (i + 1) % ct.MCTS_TRIAL_CHUNK == 0:
-                    resp = self.create_response(
-                        game, "in-progress", trials, i + 1, False)
-                    self.send_message(window, resp)
-                    if self.visualize_mcts:
-                        self.clean_path(path)
-                        self.traverse(game, path, 0, self.root)
+        if self.transpositions:
+            self.logger.info("transpositions: %d evaluations saved, "
+                             "%d nodes in table", self.evals_saved,
+                             sum(len(x) for x in self.tt.values()))
 
-        if self.visualize_mcts:
-            self.clean_path(path)
+        if self.tactics:
+            self.logger.info("tactics: %d evaluations saved, %d leaves "
+                             "restricted to forced replies",
+                             self.tactical_saves, self.forced_leaves)
+
+        if self.prune_dead:
+            self.logger.info("dead cells: %d moves pruned", self.dead_pruned)
 
         if self.root.proven:
             return self.proven_result(game)
@@ -340,7 +997,44 @@ class NeuralMCTS:
 
         self.report = "%6.3f" % (
             self.root.Q[numpy.argmax(self.root.N)]) + self.top_moves_str(game)
-        return self.root.N
+        return self.root.dense(self.root.N)
+
+    def track_patterns(self, game):
+        """ Let game keep its pattern codes up to date while the
+            pattern prior is on, and stop it when it is off """
+        if not self.pattern_prior:
+            game.patterns = None
+        elif game.patterns is None:
+            game.patterns = patterns.PatternCodes(game)
+
+    def solve_root(self, game, event):
+        """ Let the proof-number solver try to settle a late or
+            tactical root, once per position """
+        key = game.position_key()
+        if key == self.solved_key or not pnsearch.worth_solving(game):
+            return
+        if self.solver is None:
+            self.solver = pnsearch.ProofNumberSearch()
+        score, move = self.solver.solve(game, self.solver_nodes, event)
+        if event is None or not event.is_set():
+            self.solved_key = key
+        if score is None:
+            return
+        index = None
+        if move is not None:
+            index = self.root.edge(
+                naf.policy_point_index(game.turn, move))
+            if index is None:
+                # the move was pruned or left out of a restricted
+                # root, so the search has to find its own way
+                self.logger.debug("solved move %s has no root edge", move)
+                return
+        self.root.proven = True
+        self.root.score = score
+        if score == 1:
+            self.root.winning_edge = index
+        elif score == 0:
+            self.root.drawing_edge = index
 
     def clean_path(self, path):
         # remove current best path
@@ -351,11 +1045,13 @@ class NeuralMCTS:
 
     def traverse(self, game, path, level, node):
 
+        if not len(node.N):
+            return
         k = numpy.argmax(node.N)
         n = node.N[k]
         if n > 0:
-            sn = node.subnodes[k]
-            move = naf.policy_index_point(game.turn % 2, k)
+            sn = node.subnode(k)
+            move = naf.policy_index_point(game.turn % 2, node.moves[k])
             game.play(move)
 
             self.board.create_move_objects(len(game.history)-1, n)
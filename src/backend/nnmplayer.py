@@ -1,15 +1,23 @@
 #! /usr/bin/env python
 import numpy
+import time
 import random
 import logging
 import constants as ct
 import backend.naf as naf
 import backend.nneval as nneval
 import backend.nnmcts as nnmcts
+import backend.rootparallel as rootparallel
 import backend.swapmodel as swapmodel
 import backend.twixt as twixt
 from backend.point import Point
 
+# trials of one round of pondering; between rounds, pondering pauses to
+# keep to its CPU budget
+PONDER_TRIALS = 200
+# moves a game clock is shared out over, besides the increment
+MOVES_TO_GO = 30
+
 class Player:
 
     def __init__(self, **kwargs):
@@ -20,12 +28,35 @@ class Player:
         self.rotation = kwargs.get('rotation', None)
 
         self.smart_root = int(kwargs.get('smart_root', 0))
+        self.transpositions = bool(kwargs.get('transpositions', False))
+        self.tactics = bool(kwargs.get('tactics', False))
+        self.prune_dead = bool(kwargs.get('prune_dead', False))
         self.allow_swap = int(kwargs.get('allow_swap', 1))
         self.add_noise = float(kwargs.get('add_noise', 0))
+        self.pattern_prior = float(kwargs.get('pattern_prior', 0))
         self.cpuct = float(kwargs.get('cpuct', 1.0))
+        self.tree_mb = int(kwargs.get('tree_mb', 0))
+        self.solver_nodes = int(kwargs.get('solver_nodes', 0))
+        self.batch_size = int(kwargs.get('batch_size', 1))
+        self.threads = int(kwargs.get('threads', 1))
+        self.processes = int(kwargs.get('processes', 1))
+        # percent of the time used to ponder, 0 turns pondering off
+        self.ponder_cpu = int(kwargs.get('ponder', 0))
+        # time control, 0 turns each off: seconds per move, minutes per
+        # game and seconds added to the clock after each move
+        self.move_time = float(kwargs.get('move_time', 0))
+        self.game_time = float(kwargs.get('game_time', 0))
+        self.increment = float(kwargs.get('increment', 0))
+        # seconds left on the game clock, set at the first move
+        self.clock = None
+        # worker processes of root-parallel MCTS, started on first use
+        self.pool = None
+        self.kwargs = kwargs
         self.level = float(kwargs.get('level', 1.0))
         self.board = kwargs.get('board', None)
         self.evaluator = kwargs.get('evaluator', None)
+        self.eval_cache_mb = int(kwargs.get('eval_cache_mb', 0))
+        self.eval_store_mb = int(kwargs.get('eval_store_mb', 0))
 
         if self.temperature not in (0.0, 0.5, 1.0):
             raise ValueError("Unsupported temperature")
@@ -33,64 +64,70 @@ class Player:
         if self.model:
             # assert not self.socket
             if self.evaluator is None:
-                self.evaluator = nneval.NNEvaluater(self.model)
+                self.evaluator = nneval.NNEvaluater(self.model,
+                                                    self.eval_cache_mb,
+                                                    self.eval_store_mb)
 
             nneval_ = self.evaluator
-            
-            def get_pw_ml(n, r):
-                p, m = nneval_.eval_one(n)
+
+            def to_pw_ml(result, r):
+                p, m = result
                 if len(p) == 3:
                     p = naf.three_to_one(p)
                 if len(p) == 1 and len(p[0] == 3):
                     p = naf.three_to_one(p[0])
-                m = naf.rotate_policy_array(m, r)
-                if len(m) == 1:
-                    m = m[0]
+                m = naf.unrotate_policy_array(m, r)
                 return p, m
 
-            def nnfunc(game):
+            rot_map = {
+                ct.ROT_OFF: 0,
+                ct.ROT_FLIP_HOR: 1,
+                ct.ROT_FLIP_VERT: 2,
+                ct.ROT_FLIP_BOTH: 3
+            }
 
-                rot_map = {
-                    ct.ROT_OFF: 0,
-                    ct.ROT_FLIP_HOR: 1,
-                    ct.ROT_FLIP_VERT: 2,
-                    ct.ROT_FLIP_BOTH: 3
-                }
-          
-                nips = naf.NetInputs(game)
-
-                if self.rotation == ct.ROT_RAND: 
-                    rot = random.randint(0, 3)
-                    nips.rotate(rot)
-                    pw, ml = get_pw_ml(nips, rot)
-                elif self.rotation in [ct.ROT_OFF, ct.ROT_FLIP_HOR, ct.ROT_FLIP_VERT, ct.ROT_FLIP_BOTH]: 
-                    rot = rot_map[self.rotation]
-                    nips.rotate(rot)
-                    pw, ml = get_pw_ml(nips, rot)
+            def rotations():
+                if self.rotation == ct.ROT_RAND:
+                    return [random.randint(0, 3)]
+                elif self.rotation in rot_map:
+                    return [rot_map[self.rotation]]
                 elif self.rotation in [ct.ROT_AVG, ct.ROT_BEST_EVALUATION, ct.ROT_BEST_P_VALUE]:
-                    pwl, mll = [0.0, 0.0, 0.0, 0.0], [0.0, 0.0, 0.0, 0.0]
-                    pwl[0], mll[0] = get_pw_ml(nips, 0)
-                    for i in range(3):
-                        # i: 0 => nips rot 1 => nips is flipped hor  => 1 to flip ml hor
-                        # i: 1 => nips rot 2 => nips is flipped both => 3 to flip ml both
-                        # i: 2 => nips rot 1 => nips is flipped vert => 2 to flip ml vert
-                        nips.rotate(i % 2 + 1)  
-                        pwl[i + 1], mll[i + 1] = get_pw_ml(nips, (3 - i) % 3 + 1)
-                    
-                    if self.rotation == ct.ROT_AVG:
-                        pw, ml = sum(pwl) / 4.0, sum(mll) / 4.0
-                    elif self.rotation == ct.ROT_BEST_EVALUATION:
-                        imax = pwl.index(max(pwl))
-                        pw, ml = pwl[imax], mll[imax]
-                    elif self.rotation == ct.ROT_BEST_P_VALUE:
-                        p_max = [max(ml) for ml in mll]
-                        imax = p_max.index(max(p_max))
-                        pw, ml = pwl[imax], mll[imax]
-                else:
-                    self.logger.error("invalid rotation value: %s", self.rotation)
-                    
-                return pw, ml
-            
+                    # all four symmetries in one batch
+                    return naf.ENSEMBLE_ROTATIONS
+                self.logger.error("invalid rotation value: %s", self.rotation)
+                return [0]
+
+            def combine(pwl, mll):
+                if len(pwl) == 1:
+                    return pwl[0], mll[0]
+                if self.rotation == ct.ROT_AVG:
+                    return sum(pwl) / len(pwl), sum(mll) / len(mll)
+                elif self.rotation == ct.ROT_BEST_EVALUATION:
+                    imax = pwl.index(max(pwl))
+                elif self.rotation == ct.ROT_BEST_P_VALUE:
+                    p_max = [max(ml) for ml in mll]
+                    imax = p_max.index(max(p_max))
+                return pwl[imax], mll[imax]
+
+            def nnfunc_many(games):
+                # the inputs of all games and rotations go to the net in
+                # one batch
+                rots = [rotations() for _ in games]
+                nips = []
+                for game, rs in zip(games, rots):
+                    nip = naf.NetInputs(game)
+                    nips += [nip.rotated(r) for r in rs]
+                results = iter(nneval_.eval_many(nips))
+                evals = []
+                for rs in rots:
+                    pwl, mll = map(list, zip(*[to_pw_ml(next(results), r)
+                                               for r in rs]))
+                    evals.append(combine(pwl, mll))
+                return evals
+
+            def nnfunc(game):
+                return nnfunc_many([game])[0]
+
         else:
             raise Exception("Specify model or resource")
 
@@ -98,6 +135,16 @@ class Player:
             nnfunc,
             add_noise=self.add_noise,
             smart_root=self.smart_root,
+            transpositions=self.transpositions,
+            tactics=self.tactics,
+            prune_dead=self.prune_dead,
+            pattern_prior=self.pattern_prior,
+            recents=nneval_.use_recents,
+            sap_many=nnfunc_many,
+            batch_size=self.batch_size,
+            threads=self.threads,
+            tree_mb=self.tree_mb,
+            solver_nodes=self.solver_nodes,
             cpuct=self.cpuct,
             board=self.board,
             level=self.level,
@@ -125,13 +172,32 @@ class Player:
                                            0, moves=moves,
                                            P=P, Pscew=Pscew)
 
-        N = self.nm.mcts(game, self.num_trials, window, event)
+        start = time.time()
+        seconds = self.time_budget()
+        if self.processes > 1:
+            N = self.search_parallel(game, window, event, seconds)
+        else:
+            # visits of a reused or pondered tree count as trials
+            trials = max(self.num_trials - self.nm.root_visits(game), 0)
+            N = self.nm.mcts(game, trials, window, event, seconds)
+        if self.game_time:
+            self.clock += self.increment - (time.time() - start)
+            self.logger.info("clock: %.1f seconds left", self.clock)
 
         self.report = self.nm.report
+        if self.evaluator.cache is not None:
+            self.logger.info(self.evaluator.cache.report())
+        if self.evaluator.store is not None:
+            self.evaluator.store.flush()
+            self.logger.info(self.evaluator.store.report())
 
         # When a forcing win or forcing draw move is found, there's no policy
         # array returned
-        if isinstance(N, (str, Point)):
+        if isinstance(N, Point):
+            # play the proven move, not the most visited one
+            return self.nm.create_response(game, "done", self.num_trials,
+                                           self.num_trials, True, moves=[N])
+        if isinstance(N, str):
             return self.nm.create_response(game, "done", self.num_trials,
                                            self.num_trials, True)
 
@@ -151,3 +217,49 @@ class Player:
 
         return self.nm.create_response(game, "done", self.num_trials,
                                        self.num_trials, False)
+
+    def time_budget(self):
+        """ Seconds to search the next move for, None without time
+            control """
+        seconds = None
+        if self.game_time:
+            if self.clock is None:
+                self.clock = 60 * self.game_time
+            # keep half of the clock in any case
+            seconds = min(self.clock / MOVES_TO_GO + self.increment,
+                          self.clock / 2)
+            seconds = max(seconds, 0)
+        if self.move_time:
+            seconds = (self.move_time if seconds is None
+                       else min(seconds, self.move_time))
+        return seconds
+
+    def ponder(self, game, event):
+        """ Search game, a position with the opponent to move, until
+            event is set, so that the search of the next move starts
+            from the subtree of the opponent's move. Pauses between
+            rounds to use about ponder_cpu percent of the time """
+
+        if self.ponder_cpu == 0 or self.processes > 1:
+            # worker processes don't keep their trees
+            return
+        while (not event.is_set() and
+               self.nm.root_visits(game) < ct.TRIALS_MAX):
+            start = time.time()
+            result = self.nm.mcts(game, PONDER_TRIALS, None, event)
+            if isinstance(result, (str, Point)):
+                # proven, nothing left to search
+                return
+            busy = time.time() - start
+            event.wait(busy * (100 - self.ponder_cpu) / self.ponder_cpu)
+
+    def search_parallel(self, game, window, event, seconds=None):
+        """ Root-parallel MCTS in self.processes worker processes """
+
+        if self.pool is not None and self.pool.processes != self.processes:
+            self.pool.close()
+            self.pool = None
+        if self.pool is None:
+            self.pool = rootparallel.RootParallel(self.processes, self.kwargs)
+        return self.pool.search(self, game, self.num_trials, window, event,
+                                seconds)
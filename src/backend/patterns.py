@@ -0,0 +1,178 @@
+import numpy
+import backend.geometry as geo
+import backend.naf as naf
+import backend.tactics as tactics
+
+S = geo.SIZE
+
+# state of a link from a cell to a neighbour, two bits each in a code
+EMPTY, OWN, OPPONENT, BLOCKED = range(4)
+# link offsets (forward, sideways) in the frame of a color, forward
+# pointing to the nearest end line of the color
+OFFSETS = ((2, 1), (2, -1), (1, 2), (1, -2),
+           (-1, 2), (-1, -2), (-2, 1), (-2, -1))
+CODES = 1 << (2 * len(OFFSETS))
+# distance bands to the nearest end line: on it, one and two rows off,
+# and further
+BANDS = 4
+STEPS = [step for step, _ in geo.DIRECTIONS]
+
+# prior weights of the patterns
+LINK = 2.0           # links to one own peg
+JOIN = 4.0           # links to two or more own pegs
+ISOLATED = 0.25      # can never get a link
+TEMPLATE_I = 1.5     # one row off the end line, both links to it open
+TEMPLATE_II = 2.0    # two rows off the end line, both links to it open
+LONE_EDGE = 0.25     # on the end line without a link
+
+
+def _frame(color, cell, along_x):
+    """ Band of cell and its neighbour and link direction (index into
+        geometry.DIRECTIONS) per offset, -1 and -1 where the link leaves
+        the cells color may play on. along_x tells if the end lines of
+        color are rows of fixed x """
+    p = geo.point_of(cell)
+    pos = p.x if along_x else p.y
+    toward = -1 if pos < S - 1 - pos else 1
+    band = min(pos, S - 1 - pos, BANDS - 1)
+
+    links = []
+    for forward, side in OFFSETS:
+        dx, dy = ((forward * toward, side) if along_x
+                  else (side, forward * toward))
+        x, y = p.x + dx, p.y + dy
+        nb = x * S + y
+        if (0 <= x < S and 0 <= y < S and
+                (geo.PLAYABLE[color] >> nb) & 1):
+            links.append((nb, STEPS.index(nb - cell)))
+        else:
+            links.append((-1, -1))
+    return band, tuple(links)
+
+
+def _build_frames():
+    bands = numpy.zeros((2, geo.NCELLS), numpy.int32)
+    links = [[None] * geo.NCELLS for _ in range(2)]
+    for color in range(2):
+        xs = {geo.point_of(c).x for c in geo.bits_of(geo.START_LINE[color])}
+        for cell in range(geo.NCELLS):
+            bands[color, cell], links[color][cell] = _frame(
+                color, cell, len(xs) == 1)
+    return bands, links
+
+
+def _build_weights():
+    """ Prior weight per band and code """
+    codes = numpy.arange(CODES)
+    states = [(codes >> (2 * k)) & 3 for k in range(len(OFFSETS))]
+    own = sum((s == OWN).astype(numpy.int32) for s in states)
+    free = sum((s == EMPTY).astype(numpy.int32) for s in states)
+
+    def open_pair(a, b):
+        # both links to the end line are possible, or one is made
+        return (((states[a] == EMPTY) & (states[b] == EMPTY)) |
+                (states[a] == OWN) | (states[b] == OWN))
+
+    weights = numpy.ones((BANDS, CODES), numpy.float32)
+    weights *= numpy.where(own >= 2, JOIN, numpy.where(own == 1, LINK, 1.0))
+    weights[:, own + free == 0] *= ISOLATED
+    weights[0, own == 0] *= LONE_EDGE
+    weights[1, open_pair(2, 3)] *= TEMPLATE_I
+    weights[2, open_pair(0, 1)] *= TEMPLATE_II
+    return weights
+
+
+BANDS_OF, LINKS_OF = _build_frames()
+WEIGHTS = _build_weights()
+# cell of every policy index, per color to move
+POLICY_CELLS = [numpy.array([geo.cell_of(p) for p in points])
+                for points in naf.POLICY_POINTS]
+
+
+class PatternCodes:
+    """ Pattern code of every cell for both colors: the state of the
+        links a peg of the color there would have, in the frame of its
+        nearest end line. Looked up in WEIGHTS, they give a prior of
+        the moves from a few well known local shapes: links to own
+        pegs, edge templates, pegs that can never link.
+
+        A peg only changes the codes of its own cell, of the cells a
+        link away and of the ends of the links its new links cross, so
+        play and undo recompute just those. Pegs must be removed in
+        reverse order of adding. """
+
+    def __init__(self, game):
+
+        self.codes = numpy.zeros((2, geo.NCELLS), numpy.int32)
+        self.history = []
+        # start from the empty board and replay the moves of game, so
+        # that undo works back to the start of the game
+        board = game.clone()
+        board.patterns = None
+        moves = list(board.history)
+        for _ in moves:
+            board.undo()
+        pegs = [board.peg_bits(0), board.peg_bits(1)]
+        for color in range(2):
+            edges = board.paths.edges(color, board.allow_scl)
+            for cell in range(geo.NCELLS):
+                self.codes[color, cell] = self._code(color, cell, pegs,
+                                                     edges)
+        board.patterns = self
+        for move in moves:
+            board.play(move)
+
+    def clone(self):
+
+        copy = PatternCodes.__new__(PatternCodes)
+        copy.codes = self.codes.copy()
+        copy.history = list(self.history)
+        return copy
+
+    @staticmethod
+    def _code(color, cell, pegs, edges):
+        """ Code of cell for color from the pegs and the potential
+            links (PotentialPaths.edges()) of color """
+        code = 0
+        for k, (nb, d) in enumerate(LINKS_OF[color][cell]):
+            if nb < 0:
+                state = BLOCKED
+            elif (pegs[1 - color] >> nb) & 1:
+                state = OPPONENT
+            elif not (edges[d] >> cell) & 1:
+                state = BLOCKED
+            elif (pegs[color] >> nb) & 1:
+                state = OWN
+            else:
+                state = EMPTY
+            code |= state << (2 * k)
+        return code
+
+    def add_peg(self, game, color, cell):
+        """ Update the codes after a peg of color was played at cell,
+            links included """
+        cells = {cell}
+        for nb, slot, crossing in geo.LINK_SLOTS[cell]:
+            cells.add(nb)
+            if game.get_link_slot(slot, color):
+                for c in crossing:
+                    cells.update(tactics.SLOT_ENDS.get(c, ()))
+        cells = list(cells)
+        self.history.append((cells, self.codes[:, cells].copy()))
+        pegs = [game.peg_bits(0), game.peg_bits(1)]
+        for side in range(2):
+            edges = game.paths.edges(side, game.allow_scl)
+            for c in cells:
+                self.codes[side, c] = self._code(side, c, pegs, edges)
+
+    def remove_peg(self):
+        """ Restore the codes from before the peg added last """
+        cells, codes = self.history.pop()
+        self.codes[:, cells] = codes
+
+    def prior(self, color, moves):
+        """ Pattern prior of moves, policy indices of color, summing
+            to 1 """
+        cells = POLICY_CELLS[color][moves]
+        weights = WEIGHTS[BANDS_OF[color, cells], self.codes[color, cells]]
+        return weights / weights.sum()
@@ -0,0 +1,191 @@
+import time
+import logging
+import constants as ct
+import backend.geometry as geo
+import backend.tactics as tactics
+import backend.twixt as twixt
+
+# proof and disproof number of a settled node
+INF = 1 << 40
+# positions are worth solving once this many moves are played, or when
+# a player can win at once
+LATE_PLY = 40
+# most settled positions kept in the transposition table
+TT_SIZE = 1 << 20
+
+
+def worth_solving(game):
+    """ Whether a position is late or tactical enough for the solver """
+    if len(game.history) < 2:
+        # the swap isn't searched
+        return False
+    return (len(game.history) >= LATE_PLY or
+            bool(tactics.winning_cells(game, 0)) or
+            bool(tactics.winning_cells(game, 1)))
+
+
+class PNNode:
+    """ Node of a proof-number search tree. children is None until the
+        node is expanded and empty once it is settled. """
+
+    __slots__ = ("move", "pn", "dn", "children")
+
+    def __init__(self, move):
+
+        self.move = move
+        self.pn = 1
+        self.dn = 1
+        self.children = None
+
+
+class ProofNumberSearch:
+    """ Best-first proof-number search of whether a player, the
+        attacker, can force a win.
+
+        The attacker's nodes (OR) have all its moves as children, the
+        ones next to its pegs first. At the other nodes (AND), the
+        defender has to stop every win at once of the attacker if there
+        is one, so only the moves in tactics.must_play() are searched
+        there; all others lose at once. A position where the attacker
+        can't connect any more is disproved.
+
+        Settled positions are kept in a transposition table keyed by
+        position key and attacker, across searches. """
+
+    def __init__(self):
+
+        self.logger = logging.getLogger(ct.LOGGER)
+        self.tt = {}
+        self.nodes = 0
+
+    def solve(self, game, max_nodes, event=None):
+        """ Try to settle game with at most max_nodes nodes per search.
+            Returns 1 and the winning move, -1 and None if the player to
+            move loses, 0 and a drawing move, or None and None if the
+            position is still open """
+
+        start = time.time()
+        game = game.clone()
+        # the solver has no use for pattern codes
+        game.patterns = None
+        result = None, None
+        root = self.search(game, game.turn, max_nodes, event)
+        if root.pn == 0:
+            wins = tactics.winning_cells(game, game.turn)
+            if wins:
+                result = 1, geo.point_of(wins[0])
+            else:
+                result = 1, next(c.move for c in root.children
+                                 if c.pn == 0)
+        else:
+            defence = self.search(game, 1 - game.turn, max_nodes, event)
+            if defence.pn == 0:
+                result = -1, None
+            elif root.dn == 0 and defence.dn == 0:
+                # any move draws if the opponent can't connect any more
+                moves = [c.move for c in defence.children if c.dn == 0]
+                cells = tactics.free_cells(game, game.turn)
+                result = 0, (moves[0] if moves else
+                             geo.point_of((cells & -cells).bit_length() - 1))
+        self.logger.info("solver: %s in %.2f seconds",
+                         {1: "win", -1: "loss", 0: "draw",
+                          None: "open"}[result[0]], time.time() - start)
+        return result
+
+    def search(self, game, attacker, max_nodes, event):
+        """ Proof-number search of game for attacker. Returns the root,
+            with pn 0 if the attacker wins, dn 0 if it doesn't """
+
+        root = PNNode(None)
+        self.nodes = 1
+        while (root.pn and root.dn and self.nodes < max_nodes and
+               (event is None or not event.is_set())):
+            # most proving node
+            path = [root]
+            node = root
+            while node.children is not None:
+                if game.turn == attacker:
+                    node = min(node.children, key=lambda c: c.pn)
+                else:
+                    node = min(node.children, key=lambda c: c.dn)
+                game.play(node.move)
+                path.append(node)
+
+            self.expand(game, node, attacker, node is not root)
+
+            for node in reversed(path[:-1]):
+                game.undo()
+                self.update(game, node, attacker, node is root)
+        return root
+
+    def expand(self, game, node, attacker, lookup=True):
+        """ Settle node or give it its children. The root isn't looked
+            up in the transposition table, its move is needed """
+
+        key = (game.position_key(), attacker)
+        known = self.tt.get(key) if lookup else None
+        if known is not None:
+            self.settle(node, known)
+            return
+
+        mover = game.turn
+        if game.just_won():
+            won = mover != attacker
+        elif (game.result == twixt.DRAW or
+              game.paths.is_cut_off(attacker)):
+            won = False
+        elif tactics.winning_cells(game, mover):
+            won = mover == attacker
+        else:
+            won = None
+
+        if won is None:
+            free = tactics.free_cells(game, mover)
+            if mover == attacker:
+                near = free & tactics.neighbour_cells(game.peg_bits(mover))
+                cells = list(geo.bits_of(near)) + \
+                    list(geo.bits_of(free & ~near))
+            else:
+                zone = tactics.must_play(game)
+                cells = list(geo.bits_of(free if zone is None else zone))
+            if not cells:
+                # no move left, or none stops the attacker
+                won = mover != attacker
+
+        if won is not None:
+            if len(self.tt) >= TT_SIZE:
+                self.tt = {}
+            self.tt[key] = won
+            self.settle(node, won)
+            return
+
+        node.children = [PNNode(geo.point_of(cell)) for cell in cells]
+        self.nodes += len(cells)
+        if mover == attacker:
+            node.pn, node.dn = 1, len(cells)
+        else:
+            node.pn, node.dn = len(cells), 1
+
+    @staticmethod
+    def settle(node, won):
+
+        node.pn, node.dn = (0, INF) if won else (INF, 0)
+        node.children = []
+
+    def update(self, game, node, attacker, keep):
+        """ Proof and disproof number of node from its children. The
+            children of a settled node are dropped, unless keep is
+            set """
+
+        pns = [c.pn for c in node.children]
+        dns = [c.dn for c in node.children]
+        if game.turn == attacker:
+            node.pn, node.dn = min(pns), min(sum(dns), INF)
+        else:
+            node.pn, node.dn = min(sum(pns), INF), min(dns)
+        if (node.pn == 0 or node.dn == 0) and not keep:
+            won = node.pn == 0
+            if len(self.tt) >= TT_SIZE:
+                self.tt = {}
+            self.tt[(game.position_key(), attacker)] = won
+            self.settle(node, won)
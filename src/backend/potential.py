@@ -0,0 +1,173 @@
+import backend.geometry as geo
+
+S = geo.SIZE
+
+# A color is only cut off by a wall of pegs and links across its whole
+# playable width. A link spans at most two columns, so each of the two
+# walls needs about SIZE / 2 links, and a draw needs at least SIZE - 2
+# pegs on the board.
+DRAW_MIN_PEGS = S - 2
+
+# edges that start and end on cells a color may play on
+_OPEN = [tuple(valid & playable & geo.shift(playable, -step)
+               for step, valid in geo.DIRECTIONS)
+         for playable in geo.PLAYABLE]
+
+
+class PotentialPaths:
+    """ Tracks whether each color can still connect its end lines.
+
+        A color's potential path runs over cells it may still play on
+        (empty or own pegs) along links that are not crossed by opponent
+        links, nor by own links unless crossing own links is allowed.
+        For every color and link direction, a bitboard holds the cells
+        whose link in that direction is still possible. Pegs and links
+        only remove edges, so each move updates these in place, and a
+        known path (the witness) stays valid until one of its edges is
+        removed. Only then the path is searched again.
+
+        With lazy set, nothing is searched while there are fewer than
+        DRAW_MIN_PEGS pegs on the board. Pegs must be removed in reverse
+        order of adding. """
+
+    def __init__(self, lazy=True):
+
+        self.lazy = lazy
+        self.num_pegs = 0
+        # edges not blocked by opponent pegs and links, edges crossed
+        # by own links
+        self.open = [_OPEN[0], _OPEN[1]]
+        self.cut = [(0,) * 8, (0,) * 8]
+        # per color: None (not searched), or (allow_scl, path edges)
+        # where path edges is None if there is no path
+        self.witness = [None, None]
+        # (allow_scl, cells) of dead_cells(), None until asked for
+        self.dead = None
+        self.history = []
+
+    def clone(self):
+
+        copy = PotentialPaths(self.lazy)
+        copy.num_pegs = self.num_pegs
+        copy.open = list(self.open)
+        copy.cut = list(self.cut)
+        copy.witness = list(self.witness)
+        copy.dead = self.dead
+        copy.history = list(self.history)
+        return copy
+
+    def add_peg(self, color, cell, links, allow_scl):
+        """ Add a peg of color at cell together with its new links,
+            given as (plane, center bit) pairs. """
+        self.history.append((self.num_pegs, self.open, self.cut,
+                             self.witness, self.dead))
+        self.num_pegs += 1
+        self.dead = None
+
+        bit = 1 << cell
+        ocolor = 1 - color
+        oopen = [edges & ~(bit | geo.shift(bit, -step))
+                 for edges, (step, _) in zip(self.open[ocolor],
+                                             geo.DIRECTIONS)]
+        cut = list(self.cut[color])
+        for plane, lbit in links:
+            center = lbit.bit_length() - 1
+            for k, edges in geo.CROSSED[plane // 2][center]:
+                oopen[k] &= ~edges
+                cut[k] |= edges
+
+        self.open = list(self.open)
+        self.cut = list(self.cut)
+        self.open[ocolor] = tuple(oopen)
+        self.cut[color] = tuple(cut)
+        self._update_witnesses(allow_scl)
+
+    def remove_peg(self):
+        """ Remove the peg added last """
+        (self.num_pegs, self.open, self.cut,
+         self.witness, self.dead) = self.history.pop()
+
+    def is_cut_off(self, color):
+        """ Color can't connect its end lines any more """
+        return self.witness[color] is not None and \
+            self.witness[color][1] is None
+
+    def is_draw(self):
+
+        return (self.witness[0] is not None and
+                self.witness[1] is not None and
+                self.witness[0][1] is None and
+                self.witness[1][1] is None)
+
+    def dead_cells(self, allow_scl):
+        """ Cells no potential link of either color touches, as a
+            bitboard. Edges only get removed, so a peg on a dead cell
+            never gets a link nor blocks one: playing there is as good
+            as passing. Kept until the next peg is added or removed. """
+        if self.dead is None or self.dead[0] != allow_scl:
+            touched = 0
+            for color in range(2):
+                for e, (step, _) in zip(self.edges(color, allow_scl),
+                                        geo.DIRECTIONS):
+                    touched |= e | geo.shift(e, step)
+            self.dead = (allow_scl,
+                         (geo.PLAYABLE[0] | geo.PLAYABLE[1]) & ~touched)
+        return self.dead[1]
+
+    def edges(self, color, allow_scl):
+        """ Per direction, the cells whose link in that direction color
+            may still get """
+        if allow_scl:
+            return self.open[color]
+        return tuple(o & ~c for o, c in zip(self.open[color],
+                                             self.cut[color]))
+
+    def _update_witnesses(self, allow_scl):
+        if self.lazy and self.num_pegs < DRAW_MIN_PEGS:
+            return
+
+        witness = list(self.witness)
+        for color in range(2):
+            edges = self.edges(color, allow_scl)
+            if witness[color] is not None and witness[color][0] == allow_scl:
+                path = witness[color][1]
+                if path is None:
+                    # edges only get removed, there still is no path
+                    continue
+                if not any(p & ~e for p, e in zip(path, edges)):
+                    continue
+            witness[color] = (allow_scl, self._find_path(color, edges))
+        self.witness = witness
+
+    @staticmethod
+    def _find_path(color, edges):
+        """ Breadth first search from the start line to the end line.
+            Return the path as per direction bitboards of its edges, or
+            None if there is none. """
+        layers = [geo.START_LINE[color]]
+        reached = layers[0]
+        frontier = reached
+        while frontier:
+            new = 0
+            for e, (step, _) in zip(edges, geo.DIRECTIONS):
+                new |= geo.shift(frontier & e, step)
+            frontier = new & ~reached
+            reached |= frontier
+            layers.append(frontier)
+            if frontier & geo.END_LINE[color]:
+                break
+        else:
+            return None
+
+        # walk back from an end cell, one layer at a time
+        path = [0] * 8
+        end = frontier & geo.END_LINE[color]
+        cell = (end & -end).bit_length() - 1
+        for layer in reversed(layers[:-1]):
+            for k, (e, (step, _)) in enumerate(zip(edges, geo.DIRECTIONS)):
+                prev = cell - step
+                if prev >= 0 and (e >> prev) & 1 and (layer >> prev) & 1:
+                    path[k] |= 1 << prev
+                    cell = prev
+                    break
+        return path
@@ -0,0 +1,191 @@
+import time
+import queue
+import random
+import logging
+import multiprocessing
+import numpy
+import constants as ct
+from backend.nnmcts import EvalNode
+from backend.point import Point
+
+# least time between two checkpoints of a worker
+CHECKPOINT_SECONDS = 0.5
+# settings of the search that are sent along with every task, so that
+# changes in the settings dialog reach the workers
+SEARCH_SETTINGS = ("cpuct", "smart_root", "transpositions", "tactics",
+                   "prune_dead", "add_noise", "level", "batch_size",
+                   "threads", "tree_mb", "solver_nodes", "pattern_prior")
+
+
+def _work(worker, kwargs, seed, tasks, results, stop):
+    """ Main loop of a worker process: run the searches it gets from
+        tasks and put checkpoints and results of the root into
+        results """
+
+    import backend.nnmplayer as nnmplayer
+
+    random.seed(seed)
+    numpy.random.seed(seed)
+    player = nnmplayer.Player(**kwargs)
+    nm = player.nm
+    last = [0.0]
+    search = [None]
+
+    def message(kind, **values):
+        values.update(worker=worker, search=search[0], kind=kind)
+        values.update(tree_mb=nm.tree_bytes() / 2**20)
+        if nm.root is not None:
+            values.update(moves=nm.root.moves, N=nm.root.N.copy(),
+                          Q=nm.root.Q.copy(), P=nm.root.P, LM=nm.root.LM)
+        results.put(values)
+
+    def checkpoint(window, response):
+        if time.time() - last[0] >= CHECKPOINT_SECONDS:
+            last[0] = time.time()
+            message("checkpoint", current=response["current"])
+
+    nm.send_message = checkpoint
+    while True:
+        task = tasks.get()
+        if task is None:
+            return
+        search[0], game, trials, seconds, rotation, settings = task
+        player.rotation = rotation
+        for name in SEARCH_SETTINGS:
+            setattr(nm, name, settings[name])
+        try:
+            # visits of a reused tree count as trials
+            trials = max(trials - nm.root_visits(game), 0)
+            result = nm.mcts(game, trials, None, stop, seconds)
+        except Exception as e:
+            results.put({"worker": worker, "search": search[0],
+                         "kind": "error",
+                         "error": "%s: %s" % (type(e).__name__, e)})
+            continue
+        message("done", current=int(nm.root.N.sum()),
+                proven=isinstance(result, (str, Point)),
+                winning_edge=nm.root.winning_edge,
+                drawing_edge=nm.root.drawing_edge)
+
+
+class RootParallel:
+    """ Root-parallel MCTS: independent searches of the same position in
+        a pool of worker processes, each with its own network session,
+        tree and random seed. The visit counts of the roots are added up
+        and their values averaged, weighted by visits, at every
+        checkpoint and at the end.
+
+        The workers are started once and kept for all moves, since
+        loading the model takes a while. """
+
+    def __init__(self, processes, kwargs):
+
+        self.logger = logging.getLogger(ct.LOGGER)
+        self.processes = processes
+        # fork doesn't get along with TensorFlow
+        ctx = multiprocessing.get_context("spawn")
+        self.results = ctx.Queue()
+        self.stop = ctx.Event()
+        self.tasks = [ctx.Queue() for _ in range(processes)]
+        self.search_id = 0
+        kwargs = dict(kwargs, processes=1, board=None, evaluator=None,
+                      eval_store_mb=0)
+        self.workers = [
+            ctx.Process(target=_work, daemon=True,
+                        args=(i, kwargs, random.randrange(2**32),
+                              self.tasks[i], self.results, self.stop))
+            for i in range(processes)]
+        for w in self.workers:
+            w.start()
+
+    def close(self):
+
+        for t in self.tasks:
+            t.put(None)
+        for w in self.workers:
+            w.join(timeout=5)
+
+    def search(self, player, game, trials, window, event, seconds=None):
+        """ Search game with trials visits shared by all workers, with
+            the current settings of player. With a budget of seconds,
+            every worker stops when it runs out of time. Leaves the
+            merged root in player.nm.root and returns like
+            NeuralMCTS.mcts() """
+
+        start = time.time()
+        nm = player.nm
+        settings = {name: getattr(nm, name) for name in SEARCH_SETTINGS}
+        # each worker has a tree of its own
+        settings["tree_mb"] = nm.tree_mb / self.processes
+        self.search_id += 1
+        self.stop.clear()
+        for i, t in enumerate(self.tasks):
+            share = trials // self.processes
+            share += 1 if i < trials % self.processes else 0
+            t.put((self.search_id, game.clone(), share, seconds,
+                   player.rotation, settings))
+
+        latest = [None] * self.processes
+        current = [0] * self.processes
+        done = 0
+        proven = None
+        while done < self.processes:
+            if event is not None and event.is_set():
+                self.stop.set()
+            try:
+                msg = self.results.get(timeout=0.1)
+            except queue.Empty:
+                if not all(w.is_alive() for w in self.workers):
+                    raise RuntimeError("MCTS worker process died")
+                continue
+
+            if msg["search"] != self.search_id:
+                # left over from a search that failed
+                continue
+            if msg["kind"] == "error":
+                self.stop.set()
+                raise RuntimeError("MCTS worker: " + msg["error"])
+            i = msg["worker"]
+            latest[i] = msg
+            current[i] = msg["current"]
+            if msg["kind"] == "done":
+                done += 1
+                if msg["proven"] and proven is None:
+                    # one proof is enough
+                    proven = msg
+                    self.stop.set()
+            else:
+                nm.root = self.merge(latest)
+                resp = nm.progress_response(game, trials, sum(current),
+                                            start, seconds)
+                resp["tree_mb"] = sum(m["tree_mb"] for m in latest
+                                      if m is not None)
+                nm.send_message(window, resp)
+
+        # the merged root has no subtrees to reuse
+        nm.history_at_root = None
+        nm.root = self.merge(latest)
+        if proven is not None:
+            nm.root.proven = True
+            nm.root.winning_edge = proven["winning_edge"]
+            nm.root.drawing_edge = proven["drawing_edge"]
+            return nm.proven_result(game)
+
+        nm.report = "%6.3f" % (
+            nm.root.Q[numpy.argmax(nm.root.N)]) + nm.top_moves_str(game)
+        return nm.root.dense(nm.root.N)
+
+    @staticmethod
+    def merge(messages):
+        """ Root with the summed visits and the visit weighted values of
+            the workers """
+        messages = [m for m in messages if m is not None]
+        root = EvalNode(messages[0]["moves"])
+        root.P = messages[0]["P"]
+        root.LM = messages[0]["LM"]
+        N = sum(m["N"] for m in messages)
+        W = sum(m["N"] * m["Q"] for m in messages)
+        root.N = N
+        root.Q = numpy.where(N > 0, W / numpy.maximum(N, 1), 0)
+        root.rank()
+        return root
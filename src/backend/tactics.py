@@ -0,0 +1,104 @@
+import backend.geometry as geo
+
+S = geo.SIZE
+
+# link slot (as in geometry.LINK_SLOTS) -> the two cells it links
+SLOT_ENDS = {slot: (cell, nb)
+             for cell, entries in enumerate(geo.LINK_SLOTS)
+             for nb, slot, _ in entries}
+
+
+def free_cells(game, color):
+    """ Empty cells color may play on, as a bitboard """
+    return geo.PLAYABLE[color] & ~(game.peg_bits(0) | game.peg_bits(1))
+
+
+def neighbour_cells(pegs):
+    """ Cells a link away from the cells of pegs, as a bitboard """
+    bits = 0
+    for cell in geo.bits_of(pegs):
+        for nb, _, _ in geo.LINK_SLOTS[cell]:
+            bits |= 1 << nb
+    return bits
+
+
+def _linkable(game, color, crossing):
+    """ Whether a new link of color isn't blocked by any of the links
+        in the crossing slots """
+    for slot in crossing:
+        if game.get_link_slot(slot, 1 - color):
+            return False
+        if not game.allow_scl and game.get_link_slot(slot, color):
+            return False
+    return True
+
+
+def _new_links(game, color, cell, pegs):
+    """ (neighbour, crossing) of the links a peg of color at cell
+        would get """
+    return [(nb, crossing) for nb, _, crossing in geo.LINK_SLOTS[cell]
+            if (pegs >> nb) & 1 and _linkable(game, color, crossing)]
+
+
+def winning_cells(game, color):
+    """ Cells where a peg of color connects its end lines at once,
+        whoever is to move. Only cells next to a group on each end
+        line, or on the line itself, can do that. """
+    conn = game.connections
+    uf = conn.sets[color]
+    near = uf.find(conn.near)
+    far = uf.find(conn.far)
+    pegs = game.peg_bits(color)
+
+    reach = [geo.START_LINE[color], geo.END_LINE[color]]
+    for cell in geo.bits_of(pegs):
+        root = uf.find(cell)
+        if root == near:
+            reach[0] |= neighbour_cells(1 << cell)
+        elif root == far:
+            reach[1] |= neighbour_cells(1 << cell)
+
+    cells = []
+    for cell in geo.bits_of(reach[0] & reach[1] & free_cells(game, color)):
+        roots = {uf.find(nb) for nb, _ in _new_links(game, color, cell, pegs)}
+        if (geo.START_LINE[color] >> cell) & 1:
+            roots.add(near)
+        if (geo.END_LINE[color] >> cell) & 1:
+            roots.add(far)
+        if near in roots and far in roots:
+            cells.append(cell)
+    return cells
+
+
+def threat_zone(game, color, cell):
+    """ Cells where a peg of the opponent could stop the win of color
+        at cell: the cell itself and the ends of the opponent links
+        that would cross the new links of the winning peg, where the
+        other end already holds an opponent peg """
+    opegs = game.peg_bits(1 - color)
+    zone = 1 << cell
+    for _, crossing in _new_links(game, color, cell, game.peg_bits(color)):
+        for slot in crossing:
+            if slot not in SLOT_ENDS:
+                # the link would leave the board
+                continue
+            a, b = SLOT_ENDS[slot]
+            if (opegs >> b) & 1:
+                zone |= 1 << a
+            if (opegs >> a) & 1:
+                zone |= 1 << b
+    return zone
+
+
+def must_play(game):
+    """ Cells where the player to move stops all wins at once of the
+        opponent, as a bitboard, or None if the opponent has none. 0
+        means the opponent can't be stopped. """
+    color = 1 - game.turn
+    threats = winning_cells(game, color)
+    if not threats:
+        return None
+    zone = free_cells(game, game.turn)
+    for cell in threats:
+        zone &= threat_zone(game, color, cell)
+    return zone
@@ -3,8 +3,12 @@ import numpy
 import logging
 from collections import namedtuple
 import constants as ct
+import backend.geometry as geo
+import backend.zobrist as zobrist
 from backend.point import Point
 from backend.select_set import SelectSet
+from backend.unionfind import PegConnections
+from backend.potential import PotentialPaths
 from backend.board import TwixtBoard
 
 SWAP = "swap"
@@ -14,15 +18,24 @@ MAXBEST = 24**24
 
 LinkDescription = namedtuple('LinkDescription', 'p1 p2 owner')
 
+
+def create_game(allow_scl, engine=ct.ENGINE_NUMPY):
+    """ Create a game using the given position engine. All engines
+        share the Game API, so the bots and the ui work with either. """
+    if engine == ct.ENGINE_BITBOARD:
+        import backend.bitboard as bitboard
+        return bitboard.BitboardGame(allow_scl)
+    return Game(allow_scl)
+
+
 class Game:
-    SIZE = 24
-    LINK_LONGY = 4
-    LINK_DIFFSIGN = 2
+    SIZE = geo.SIZE
+    LINK_LONGY = geo.LINK_LONGY
+    LINK_DIFFSIGN = geo.LINK_DIFFSIGN
     BLACK = 0
     WHITE = 1
-    DLINKS            = [(-2, -1), (-1, -2), (1, -2), (2, -1), (2, 1), (1, 2), (-1, 2), (-2, 1)]
-    DLINKS_RIGHTFIRST = [(2, -1), (2, 1), (1, -2), (1, 2), (-1, -2), (-1, 2), (-2, -1), (-2, 1)]
-    DLINKS_DOWNFIRST  = [(-1, 2), (1, 2), (-2, 1), (2, 1), (-2, -1), (2, -1), (-1, -2), (1, -2)]
+    DLINKS = geo.DLINKS
+    CROSS_LINKS = geo.CROSS_LINKS
 
     COLOR_NAME = ("BLACK", "WHITE")
 
@@ -34,12 +47,17 @@ class Game:
         self.history = []
         self.pegs = [numpy.zeros((Game.SIZE, Game.SIZE), numpy.int8)
                      for _ in range(2)]
-        self.links = [numpy.zeros((Game.SIZE, Game.SIZE), numpy.int8)
-                      for _ in range(8)]
+        self.links = numpy.zeros((8, Game.SIZE, Game.SIZE), numpy.int8)
         self.turn = Game.WHITE
         self.open_pegs = [SelectSet(), SelectSet()]
-        self.reachable = [set(), set()]
-        self.reachable_history = []
+        self.connections = PegConnections(Game.SIZE)
+        self.paths = PotentialPaths()
+        # backend.patterns.PatternCodes, kept up to date once set
+        self.patterns = None
+        # Zobrist keys of pegs and links, as is and as seen by the net
+        # when BLACK is to move
+        self.zkey = 0
+        self.zkey_t = 0
 
         for x in range(Game.SIZE):
             for y in range(Game.SIZE):
@@ -57,16 +75,42 @@ class Game:
 
     def clone(self):
 
-        copy = Game(self.allow_scl)
+        # skip __init__, filling the open peg sets is expensive and
+        # clones are made for every leaf of a batched MCTS search
+        copy = Game.__new__(Game)
+        copy.logger = self.logger
+        copy.allow_scl = self.allow_scl
+        copy.result = self.result
         copy.history = list(self.history)
         copy.pegs = numpy.array(self.pegs)
         copy.links = numpy.array(self.links)
         copy.turn = self.turn
         copy.open_pegs = [x.clone() for x in self.open_pegs]
-        copy.reachable = [set(x) for x in self.reachable]
-        copy.reachable_history = list(self.reachable_history)
+        copy.connections = self.connections.clone()
+        copy.paths = self.paths.clone()
+        copy.patterns = (None if self.patterns is None
+                         else self.patterns.clone())
+        copy.zkey = self.zkey
+        copy.zkey_t = self.zkey_t
         return copy
 
+    def position_key(self):
+        """ 64 bit Zobrist key of pegs, links and side to move """
+        if self.turn == Game.BLACK:
+            return self.zkey ^ zobrist.BLACK_TO_MOVE
+        return self.zkey
+
+    def normalized_key(self):
+        """ 64 bit Zobrist key of the position as naf.NetInputs feeds
+            it to the net, i.e. with the player to move as WHITE """
+        if self.turn == Game.BLACK:
+            return self.zkey_t
+        return self.zkey
+
+    def _toggle_peg_key(self, color, cell):
+        self.zkey ^= zobrist.PEG_KEYS[color][cell]
+        self.zkey_t ^= zobrist.PEG_KEYS_T[color][cell]
+
     def turn_to_player(self, turn=None):
         if turn is not None or turn == 0:
             return 2 - turn
@@ -77,12 +121,13 @@ class Game:
 
         return self.is_winning(1 - self.turn)
 
-    def _is_a_draw(self):
-        return not (self._has_end_to_end_path(0) or self._has_end_to_end_path(1))
+    def is_draw(self):
+        """ Neither color can connect its end lines any more """
+        return self.paths.is_draw()
 
     def is_winning(self, color):
 
-        return "win" in self.reachable[color]
+        return self.connections.winning[color]
 
     def play_swap(self):
 
@@ -95,19 +140,19 @@ class Game:
 
         self.turn = Game.WHITE
 
-        self.reachable[Game.BLACK] = set()
-        for p in self.reachable[Game.WHITE]:
-            q = Point(p.y, p.x)
-            self.reachable[Game.BLACK].add(q)
-        self.reachable[Game.WHITE] = set()
-        self.reachable_history.append([])
+        self._toggle_peg_key(Game.WHITE, geo.cell_of(a))
+        self._toggle_peg_key(Game.BLACK, geo.cell_of(b))
 
-        """
-        self.open_pegs[0].add(a)
-        self.open_pegs[1].add(a)
-        self.open_pegs[0].remove(b)
-        self.open_pegs[1].remove(b)
-        """
+        self.connections.remove_peg()
+        self.connections.add_peg(Game.BLACK, geo.cell_of(b), [])
+        self.paths.remove_peg()
+        self.paths.add_peg(Game.BLACK, geo.cell_of(b), [], self.allow_scl)
+        if self.patterns is not None:
+            self.patterns.remove_peg()
+            self.patterns.add_peg(self, Game.BLACK, geo.cell_of(b))
+
+        self._open_point(a)
+        self._close_point(b)
 
     def undo_swap(self):
 
@@ -120,12 +165,31 @@ class Game:
 
         self.turn = Game.BLACK
 
-        self.reachable[Game.WHITE] = set()
-        for p in self.reachable[Game.BLACK]:
-            q = Point(p.y, p.x)
-            self.reachable[Game.WHITE].add(q)
-        self.reachable[Game.BLACK] = set()
-        self.reachable_history.pop()
+        self._toggle_peg_key(Game.WHITE, geo.cell_of(a))
+        self._toggle_peg_key(Game.BLACK, geo.cell_of(b))
+
+        self.connections.remove_peg()
+        self.connections.add_peg(Game.WHITE, geo.cell_of(a), [])
+        self.paths.remove_peg()
+        self.paths.add_peg(Game.WHITE, geo.cell_of(a), [], self.allow_scl)
+        if self.patterns is not None:
+            self.patterns.remove_peg()
+            self.patterns.add_peg(self, Game.WHITE, geo.cell_of(a))
+
+        self._open_point(b)
+        self._close_point(a)
+
+    def _open_point(self, p):
+
+        if p.x not in (0, Game.SIZE - 1):
+            self.open_pegs[Game.WHITE].add(p)
+        if p.y not in (0, Game.SIZE - 1):
+            self.open_pegs[Game.BLACK].add(p)
+
+    def _close_point(self, p):
+
+        self.open_pegs[0].remove(p)
+        self.open_pegs[1].remove(p)
 
     def play(self, move, check_draw=False):
 
@@ -145,85 +209,58 @@ class Game:
         else:
             assert move.y != 0 and move.y != Game.SIZE - 1
 
-        for dlink in Game.DLINKS:
-            pt = move + dlink
-            if (not Game.inbounds(pt)) or self.pegs[self.turn][pt] == 0:
+        cell = geo.cell_of(move)
+        turn = self.turn
+        pegs = self.pegs[turn].reshape(-1)
+        links = self.links.reshape(-1)
+        linked = []
+        slots = []
+        for nb, slot, crossing in geo.LINK_SLOTS[cell]:
+            if pegs[nb] == 0:
                 continue
-            if self.any_crossing_links(move, pt, 1 - self.turn):
+            if self._any_slot_linked(links, crossing, 1 - turn):
                 continue
             if (not self.allow_scl and
-                    self.any_crossing_links(move, pt, self.turn)):
+                    self._any_slot_linked(links, crossing, turn)):
                 continue
 
-            self.set_link(move, pt, self.turn, 1)
+            slot += turn * geo.NCELLS
+            links[slot] = 1
+            self.zkey ^= zobrist.LINK_KEYS[slot]
+            self.zkey_t ^= zobrist.LINK_KEYS_T[slot]
+            linked.append(nb)
+            plane, center = divmod(slot, geo.NCELLS)
+            slots.append((plane, 1 << center))
 
-        self.pegs[self.turn][move] = 1
+        pegs[cell] = 1
+        self._toggle_peg_key(turn, cell)
 
         self.history.append(move)
-        self.reachable_history.append(self._update_add_reachable(move))
-        
+        self.connections.add_peg(turn, cell, linked)
+        self.paths.add_peg(turn, cell, slots, self.allow_scl)
+        if self.patterns is not None:
+            self.patterns.add_peg(self, turn, cell)
+
         self._flip_turn()
 
-        self.open_pegs[0].remove(move)
-        self.open_pegs[1].remove(move)
+        self._close_point(move)
 
-        if self._is_a_draw():
+        if self.paths.is_draw():
             self.result = DRAW
 
         # end play(self)
 
-    def _update_add_reachable(self, move):
-
-        added = []
-        color = self.turn
-        my_reachable = self.reachable[color]
-
-        if move.x == self.SIZE - 1 or move.y == self.SIZE - 1:
-            # reachable because at the far boundary
-            added.append(move)
-        else:
-            # reachable because links to another reachable
-            for dlink in Game.DLINKS:
-                other = move + dlink
-                if other in my_reachable and self.get_link(move, other, color):
-                    added.append(move)
-                    if move.x == 0 or move.y == 0:
-                        added.append("win")
-                        my_reachable.add(move)
-                        my_reachable.add("win")
-                        return added
-                    break
-
-        if not added:
-            return added
-
-        # fun may commence!
-        my_reachable.add(move)
-        unvisited = [move]
-
-        while unvisited:
-            chk = unvisited.pop()
-            assert chk in my_reachable
-            for dlink in Game.DLINKS:
-                other = chk + dlink
-                if (self.inbounds(other) and
-                        other not in my_reachable and
-                        self.get_peg(other, color) and
-                        self.get_link(chk, other, color)):
-                    added.append(other)
-                    unvisited.append(other)
-                    my_reachable.add(other)
-                    if other.x == 0 or other.y == 0:
-                        added.append("win")
-                        my_reachable.add("win")
-                        return added
-
-        return added
-
     def get_peg(self, point, color):
 
         return self.pegs[color][point]
 
+    def peg_bits(self, color):
+        """ Pegs of color as a bitboard of cells """
+        bits = 0
+        for cell in numpy.flatnonzero(self.pegs[color]).tolist():
+            bits |= 1 << cell
+        return bits
+
     def safe_get_peg(self, point, color):
 
         if not Game.inbounds(point):
@@ -321,44 +358,24 @@ class Game:
 
     def any_crossing_links(self, a, b, color, value=None):
 
-        # reverse parity crosses three times.
-        debug = False
-
-        delta = b - a
-        dshort = Point((delta.x & 1) * delta.x, (delta.y & 1) * delta.y)
-        dlong = Point((delta.x - dshort.x) / 2, (delta.y - dshort.y) / 2)
-        if debug:
-            self.logger.debug(
-                "any_crossing_links. a=%s, b=%s, color=%s", a, b, color)
-            self.logger.debug("delta=(%d,%d)", delta.x, delta.y)
-            self.logger.debug("dlong=(%d,%d)", dlong.x, dlong.y)
-            self.logger.debug("dshort=(%d,%d)", dshort.x, dshort.y)
-
-        cross_links = [
-            (-1, 1, 1, 0),
-            (0, 1, 2, 0),
-            (1, 1, 3, 0),
-
-            (0, 1, 1, -1),
-            (0, 2, 1, 0),
-            (1, 1, 2, -1),
-            (1, 2, 2, 0),
-
-            (0, -1, 1, 1),
-            (1, 0, 2, 2)
-        ]
-
-        found = False
-        for cl in cross_links:
-            c = a + dlong * cl[0] + dshort * cl[1]
-            d = a + dlong * cl[2] + dshort * cl[3]
-            if debug:
-                self.logger.debug("checking %d,%d", c, d)
-            if (self.inbounds(c) and self.inbounds(d) and
-                    self.get_link(c, d, color)):
-                found = True
-                self.set_link(c, d, color, 1)
-        return found
+        entry = geo.LINK_OF.get((geo.cell_of(a), geo.cell_of(b)))
+        if entry is None:
+            return False
+        return self._any_slot_linked(self.links.reshape(-1), entry[1], color)
+
+    @staticmethod
+    def _any_slot_linked(links, slots, color):
+        """ Whether any of slots holds a link of color in the flattened
+            link planes links """
+        offset = color * geo.NCELLS
+        for slot in slots:
+            if links[slot + offset]:
+                return True
+        return False
+
+    def get_link_slot(self, slot, color):
+        """ Link of color in a slot of geometry.LINK_SLOTS """
+        return self.links.reshape(-1)[slot + color * geo.NCELLS]
 
     def undo(self, check_draw=False):
 
@@ -372,22 +389,27 @@ class Game:
         assert self.pegs[uturn][umove] == 1
         self.pegs[uturn][umove] = 0
 
-        for dlink in Game.DLINKS:
-            lend = umove + dlink
-            if Game.inbounds(lend):
-                self.set_link(umove, lend, uturn, 0)
+        cell = geo.cell_of(umove)
+        self._toggle_peg_key(uturn, cell)
+        links = self.links.reshape(-1)
+        offset = uturn * geo.NCELLS
+        for _, slot, _ in geo.LINK_SLOTS[cell]:
+            slot += offset
+            if links[slot]:
+                links[slot] = 0
+                self.zkey ^= zobrist.LINK_KEYS[slot]
+                self.zkey_t ^= zobrist.LINK_KEYS_T[slot]
 
         self.history.pop()
         self.turn = uturn
-        rh = self.reachable_history.pop()
-        for p in rh:
-            assert p in self.reachable[uturn], (p)
-            self.reachable[uturn].remove(p)
+        self.connections.remove_peg()
+        self.paths.remove_peg()
+        if self.patterns is not None:
+            self.patterns.remove_peg()
+        if self.result == DRAW and not self.paths.is_draw():
+            self.result = None
 
-        if umove.x not in (0, Game.SIZE - 1):
-            self.open_pegs[Game.WHITE].add(umove)
-        if umove.y not in (0, Game.SIZE - 1):
-            self.open_pegs[Game.BLACK].add(umove)
+        self._open_point(umove)
 
         # end undo
              
@@ -506,33 +528,3 @@ class Game:
             out += lc
 
         return out + "\n"
-
-    def _has_end_to_end_path(self, turn):
-        check_board = Game(True)
-        visited = []
-        link_range = Game.DLINKS_DOWNFIRST if turn == Game.WHITE else Game.DLINKS_RIGHTFIRST 
-        for i in range(1, Game.SIZE-1):
-            # (i,0) for WHITE. (0,i) for BLACK
-            pStart = Point(i * turn, i * (1 - turn))
-            check_board.pegs[turn][pStart] = 1
-            if self._find_path_to_end(check_board, turn, pStart, visited, link_range):
-                return True
-        return False
-
-    def _find_path_to_end(self, check_board, turn, p, visited, link_range):
-        visited.append(p)
-        for dlink in link_range:
-            pt = p + dlink
-            if self.inbounds_for_player(pt, turn) and pt not in visited and not self.pegs[1-turn][pt]:
-                # pt is a valid move (empty or own color)
-                if not self.any_crossing_links(p, pt, 1-turn) and (self.allow_scl or not self.any_crossing_links(p, pt, turn)):
-                    # there are no links crossing link (p, pt)
-                    check_board.pegs[turn][pt] = 1
-                    check_board.set_link(p, pt, turn, 1)
-                    # if pt is on opposite endline - we found a path
-                    if (turn == Game.WHITE and pt.y == Game.SIZE-1) or (turn == Game.BLACK and pt.x == Game.SIZE-1):
-                        return True
-                    elif self._find_path_to_end(check_board, turn, pt, visited, link_range):
-                        return True
-        return False
-
@@ -0,0 +1,105 @@
+class UndoableUnionFind:
+    """ Disjoint sets over 0..n-1 with union by size.
+
+        There is no path compression, so every union changes exactly one
+        parent pointer and can be rolled back in constant time. find() is
+        O(log n) since trees stay balanced. """
+
+    def __init__(self, n):
+
+        self.parent = list(range(n))
+        self.size = [1] * n
+        self.joined = []
+
+    def clone(self):
+
+        copy = UndoableUnionFind(0)
+        copy.parent = list(self.parent)
+        copy.size = list(self.size)
+        copy.joined = list(self.joined)
+        return copy
+
+    def find(self, x):
+
+        parent = self.parent
+        while parent[x] != x:
+            x = parent[x]
+        return x
+
+    def union(self, a, b):
+
+        a = self.find(a)
+        b = self.find(b)
+        if a == b:
+            return False
+        if self.size[a] < self.size[b]:
+            a, b = b, a
+        self.parent[b] = a
+        self.size[a] += self.size[b]
+        self.joined.append(b)
+        return True
+
+    def connected(self, a, b):
+
+        return self.find(a) == self.find(b)
+
+    def mark(self):
+
+        return len(self.joined)
+
+    def rollback(self, mark):
+        """ Undo all unions done since mark() returned mark """
+        while len(self.joined) > mark:
+            b = self.joined.pop()
+            a = self.parent[b]
+            self.size[a] -= self.size[b]
+            self.parent[b] = b
+
+
+class PegConnections:
+    """ Linked groups of pegs per color, used for win detection.
+
+        Cells are numbered x * size + y. Each color has two virtual nodes
+        for the near (x == 0 or y == 0) and far (x == size - 1 or
+        y == size - 1) end lines; a color has won once they are connected.
+        Pegs must be removed in reverse order of adding. """
+
+    def __init__(self, size):
+
+        self.size = size
+        self.near = size * size
+        self.far = size * size + 1
+        self.sets = [UndoableUnionFind(size * size + 2) for _ in range(2)]
+        self.winning = [False, False]
+        self.history = []
+
+    def clone(self):
+
+        copy = PegConnections(self.size)
+        copy.sets = [x.clone() for x in self.sets]
+        copy.winning = list(self.winning)
+        copy.history = list(self.history)
+        return copy
+
+    def add_peg(self, color, cell, linked):
+        """ Add a peg of color at cell, linked to the pegs at the
+            cells in linked. """
+        uf = self.sets[color]
+        self.history.append((color, uf.mark(), self.winning[color]))
+
+        x, y = divmod(cell, self.size)
+        if x == 0 or y == 0:
+            uf.union(cell, self.near)
+        elif x == self.size - 1 or y == self.size - 1:
+            uf.union(cell, self.far)
+        for other in linked:
+            uf.union(cell, other)
+
+        if not self.winning[color]:
+            self.winning[color] = uf.connected(self.near, self.far)
+
+    def remove_peg(self):
+        """ Remove the peg added last """
+        color, mark, winning = self.history.pop()
+        self.sets[color].rollback(mark)
+        self.winning[color] = winning
@@ -0,0 +1,32 @@
+import random
+
+import backend.geometry as geo
+
+# Zobrist keys for pegs and links, indexed by color and cell, and by
+# flat link slot (plane * NCELLS + center, see geometry.LINK_SLOTS).
+# The seed is fixed so that keys are the same in every run and may be
+# stored, e.g. in an evaluation cache on disk.
+_rng = random.Random(0x7477697874)
+
+PEG_KEYS = [[_rng.getrandbits(64) for _ in range(geo.NCELLS)]
+            for _ in range(2)]
+LINK_KEYS = [_rng.getrandbits(64) for _ in range(8 * geo.NCELLS)]
+BLACK_TO_MOVE = _rng.getrandbits(64)
+
+
+def _transpose(cell):
+    x, y = divmod(cell, geo.SIZE)
+    return y * geo.SIZE + x
+
+
+# Keys of the same pegs and links as naf.NetInputs shows them to the net
+# when BLACK is to move: the board is transposed and colors are swapped,
+# so link plane color + diffsign + longy becomes
+# (1 - color) + diffsign + (LINK_LONGY - longy), i.e. plane ^ 5.
+PEG_KEYS_T = [[PEG_KEYS[1 - color][_transpose(cell)]
+               for cell in range(geo.NCELLS)]
+              for color in range(2)]
+LINK_KEYS_T = [LINK_KEYS[((slot // geo.NCELLS) ^ 5) * geo.NCELLS +
+                         _transpose(slot % geo.NCELLS)]
+               for slot in range(8 * geo.NCELLS)]
+
@@ -73,6 +73,36 @@ ROT_FLIP_BOTH = "flip both"
 ROTATION_LIST = [ROT_OFF, ROT_RAND, ROT_AVG, ROT_BEST_EVALUATION,
                  ROT_BEST_P_VALUE, ROT_FLIP_HOR, ROT_FLIP_VERT, ROT_FLIP_BOTH]
 
+ENGINE_NUMPY = "numpy"
+ENGINE_BITBOARD = "bitboard"
+
+ENGINE_LIST = [ENGINE_NUMPY, ENGINE_BITBOARD]
+
+# memory budget of the evaluation cache in MB, 0 turns it off
+EVAL_CACHE_LIST = [0, 16, 64, 256, 1024]
+# size cap of the evaluation store on disk in MB, 0 turns it off
+EVAL_STORE_LIST = [0, 64, 256, 1024, 4096]
+EVAL_STORE_FOLDER = path.join(path.dirname(__file__), "evalstore")
+# MCTS leaves evaluated by the network in one call
+BATCH_SIZE_LIST = [1, 2, 4, 8, 16, 32]
+# MCTS worker threads sharing one tree
+THREADS_LIST = [1, 2, 4, 8, 16]
+# MCTS worker processes, each searching a tree of its own
+PROCESSES_LIST = [1, 2, 4, 8, 16]
+# time control: seconds per move, minutes per game and seconds added to
+# the game clock after every move; 0 turns each off
+MOVE_TIME_LIST = [0, 1, 2, 5, 10, 20, 30, 60, 120]
+GAME_TIME_LIST = [0, 1, 3, 5, 10, 15, 30, 60, 90]
+INCREMENT_LIST = [0, 1, 2, 5, 10, 20, 30]
+# memory budget of a bot's search tree in MB, 0 is unlimited
+TREE_MEMORY_LIST = [0, 64, 256, 1024, 4096, 16384]
+# weight of the pattern prior in the policy of MCTS, 0 is off
+PATTERN_PRIOR_LIST = [0, 0.1, 0.25, 0.5]
+# node budget of the endgame solver, 0 is off
+SOLVER_NODES_LIST = [0, 1000, 10000, 100000, 1000000]
+# percent of the time a bot searches while the opponent thinks, 0 is off
+PONDER_LIST = [0, 25, 50, 75, 100]
+
 
 # logging
 LOG_LEVEL_LIST = list(map(logging.getLevelName, range(10, 60, 10)))
@@ -86,17 +116,38 @@ K_MODEL_FOLDER = ['model folder', "P1_MODEL_FOLDER",
 K_RANDOM_ROTATION = ['random rotation',
                      'P1_RANDOM_ROTATION', 'P2_RANDOM_ROTATION', False, False]
 K_TRIALS = ['trials', 'P1_TRIALS', 'P2_TRIALS', 0, 0]
+K_MOVE_TIME = ['time per move (s)', 'P1_MOVE_TIME', 'P2_MOVE_TIME', 0, 0]
+K_GAME_TIME = ['game time (min)', 'P1_GAME_TIME', 'P2_GAME_TIME', 0, 0]
+K_INCREMENT = ['increment (s)', 'P1_INCREMENT', 'P2_INCREMENT', 0, 0]
 K_SMART_ROOT = ['smart root', 'P1_SMART_ROOT',
                 'P2_SMART_ROOT', False, False]
+K_TRANSPOSITIONS = ['transpositions', 'P1_TRANSPOSITIONS',
+                    'P2_TRANSPOSITIONS', False, False]
+K_TACTICS = ['tactics', 'P1_TACTICS', 'P2_TACTICS', False, False]
+K_PRUNE_DEAD = ['prune dead cells', 'P1_PRUNE_DEAD', 'P2_PRUNE_DEAD',
+                False, False]
 K_TEMPERATURE = ['temperature', 'P1_TEMPERATURE', 'P2_TEMPERATURE', 0.0, 0.0]
 K_CPUCT = ['cpuct', 'P1_CPUCT', 'P2_CPUCT', 1.0, 1.0]
+K_BATCH_SIZE = ['batch size', 'P1_BATCH_SIZE', 'P2_BATCH_SIZE', 1, 1]
+K_THREADS = ['threads', 'P1_THREADS', 'P2_THREADS', 1, 1]
+K_PROCESSES = ['processes', 'P1_PROCESSES', 'P2_PROCESSES', 1, 1]
+K_PONDER = ['ponder (% CPU)', 'P1_PONDER', 'P2_PONDER', 0, 0]
+K_TREE_MEMORY = ['tree memory (MB)', 'P1_TREE_MEMORY', 'P2_TREE_MEMORY',
+                 1024, 1024]
+K_SOLVER_NODES = ['solver nodes', 'P1_SOLVER_NODES', 'P2_SOLVER_NODES',
+                  0, 0]
 K_ROTATION = ['rotation', 'P1_ROTATION', 'P2_ROTATION', ROT_OFF, ROT_OFF]
 K_LEVEL = ['level', 'P1_LEVEL', 'P2_LEVEL', 1.0, 1.0]
 K_ADD_NOISE = ['add noise', 'P1_ADD_NOISE', 'P2_ADD_NOISE', 0.0, 0.0]
+K_PATTERN_PRIOR = ['pattern prior', 'P1_PATTERN_PRIOR', 'P2_PATTERN_PRIOR',
+                   0, 0]
 
 # keys - general
 K_ALLOW_SWAP = ['allow swap', 'ALLOW_SWAP', None, True]
 K_ALLOW_SCL = ['allow crossing own links', 'ALLOW_SCL', None, False]
+K_ENGINE = ['position engine', 'ENGINE', None, ENGINE_NUMPY]
+K_EVAL_CACHE = ['evaluation cache (MB)', 'EVAL_CACHE', None, 64]
+K_EVAL_STORE = ['evaluation store (MB)', 'EVAL_STORE', None, 0]
 K_BOARD_SIZE = ['board size (pixels)', 'BOARD_SIZE', None, 600]
 K_SHOW_LABELS = ['show labels', 'SHOW_LABELS', None, True]
 K_SHOW_GUIDELINES = ['show guidelines', 'SHOW_GUIDELINES', None, False]
@@ -132,12 +183,16 @@ K_SPLASH_STATUS_TEXT = ['SPLASH_STATUS_TEXT']
 K_THREAD = [None, 'THREAD']
 
 
-SETTING_KEYS = [K_ALLOW_SWAP, K_ALLOW_SCL, K_SMART_ACCEPT,
+SETTING_KEYS = [K_ALLOW_SWAP, K_ALLOW_SCL, K_ENGINE, K_EVAL_CACHE,
+                K_EVAL_STORE, K_SMART_ACCEPT,
                 K_COLOR, K_NAME, K_AUTO_MOVE, K_TRIALS, K_MODEL_FOLDER,
                 K_TEMPERATURE, K_CPUCT, K_ADD_NOISE, K_ROTATION, K_LEVEL,
                 K_BOARD_SIZE, K_LOG_LEVEL, K_SMART_ROOT, K_RESIGN_THRESHOLD,
                 K_SHOW_LABELS, K_SHOW_GUIDELINES, K_SHOW_CURSOR_LABEL,
-                K_HIGHLIGHT_LAST_MOVE]
+                K_HIGHLIGHT_LAST_MOVE, K_TRANSPOSITIONS, K_TACTICS,
+                K_PRUNE_DEAD, K_BATCH_SIZE, K_THREADS, K_PROCESSES,
+                K_PONDER, K_MOVE_TIME, K_GAME_TIME, K_INCREMENT,
+                K_TREE_MEMORY, K_SOLVER_NODES, K_PATTERN_PRIOR]
 
 
 WINDOW_TITLE = 'twixtbot-ui'
@@ -149,6 +204,7 @@ MSG_NO_CONFIG_FILE = (f'No settings file found.\nCreating '
                       f'{SETINGS_FILE_NAME} with default settings.')
 MSG_ERROR_UPDATING_KEY = ('Problem updating settings from window values. '
                           'key=%s, exc=%s')
+MSG_TREE_FULL = "search stopped: the tree doesn't fit its memory budget"
 
 ITEM_FILE = "&File"
 ITEM_OPEN_FILE = "&Open File..."
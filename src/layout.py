@@ -270,6 +270,27 @@ def st_row_allow_scl():
                         key=ct.K_ALLOW_SCL[1])]
 
 
+def st_row_engine():
+    return [st_label(ct.K_ENGINE[0]),
+            sg.Combo(ct.ENGINE_LIST, ct.K_ENGINE[3], size=(15, 1),
+                     key=ct.K_ENGINE[1], readonly=True),
+            sg.Text(ct.MSG_REQUIRES_RESTART, pad=((0, 20), (0, 0)))]
+
+
+def st_row_eval_cache():
+    return [st_label(ct.K_EVAL_CACHE[0]),
+            sg.Combo(ct.EVAL_CACHE_LIST, ct.K_EVAL_CACHE[3], size=(15, 1),
+                     key=ct.K_EVAL_CACHE[1], readonly=True),
+            sg.Text(ct.MSG_REQUIRES_RESTART, pad=((0, 20), (0, 0)))]
+
+
+def st_row_eval_store():
+    return [st_label(ct.K_EVAL_STORE[0]),
+            sg.Combo(ct.EVAL_STORE_LIST, ct.K_EVAL_STORE[3], size=(15, 1),
+                     key=ct.K_EVAL_STORE[1], readonly=True),
+            sg.Text(ct.MSG_REQUIRES_RESTART, pad=((0, 20), (0, 0)))]
+
+
 def st_row_smart_accept():
     return [st_label(ct.K_SMART_ACCEPT[0]),
             sg.Checkbox(text="", default=ct.K_SMART_ACCEPT[3],
@@ -318,12 +339,37 @@ def st_row_trials(player):
                       size=(11, 20), key=ct.K_TRIALS[player])]
 
 
+def st_row_move_time(player):
+    return [st_label(ct.K_MOVE_TIME[0]),
+            sg.Combo(ct.MOVE_TIME_LIST, ct.K_MOVE_TIME[player + 2],
+                     size=(5, 1), key=ct.K_MOVE_TIME[player], readonly=True)]
+
+
+def st_row_game_time(player):
+    return [st_label(ct.K_GAME_TIME[0]),
+            sg.Combo(ct.GAME_TIME_LIST, ct.K_GAME_TIME[player + 2],
+                     size=(5, 1), key=ct.K_GAME_TIME[player], readonly=True)]
+
+
+def st_row_increment(player):
+    return [st_label(ct.K_INCREMENT[0]),
+            sg.Combo(ct.INCREMENT_LIST, ct.K_INCREMENT[player + 2],
+                     size=(5, 1), key=ct.K_INCREMENT[player], readonly=True)]
+
+
 def st_row_temperature(player):
     return [st_label(ct.K_TEMPERATURE[0]),
             sg.Combo(ct.TEMPERATURE_LIST, ct.K_TEMPERATURE[player + 2],
                      size=(5, 1), key=ct.K_TEMPERATURE[player], readonly=True)]
 
 
+def st_row_pattern_prior(player):
+    return [st_label(ct.K_PATTERN_PRIOR[0]),
+            sg.Combo(ct.PATTERN_PRIOR_LIST, ct.K_PATTERN_PRIOR[player + 2],
+                     size=(5, 1), key=ct.K_PATTERN_PRIOR[player],
+                     readonly=True)]
+
+
 def st_row_add_noise(player):
     return [st_label(ct.K_ADD_NOISE[0]),
             sg.Spin(values=[float(x / 100.0) for x in range(101)],
@@ -338,6 +384,44 @@ def st_row_cpuct(player):
                     key=ct.K_CPUCT[player], size=(5, 0), readonly=True)]
 
 
+def st_row_batch_size(player):
+    return [st_label(ct.K_BATCH_SIZE[0]),
+            sg.Combo(ct.BATCH_SIZE_LIST, ct.K_BATCH_SIZE[player + 2],
+                     size=(5, 1), key=ct.K_BATCH_SIZE[player], readonly=True)]
+
+
+def st_row_threads(player):
+    return [st_label(ct.K_THREADS[0]),
+            sg.Combo(ct.THREADS_LIST, ct.K_THREADS[player + 2],
+                     size=(5, 1), key=ct.K_THREADS[player], readonly=True)]
+
+
+def st_row_processes(player):
+    return [st_label(ct.K_PROCESSES[0]),
+            sg.Combo(ct.PROCESSES_LIST, ct.K_PROCESSES[player + 2],
+                     size=(5, 1), key=ct.K_PROCESSES[player], readonly=True)]
+
+
+def st_row_ponder(player):
+    return [st_label(ct.K_PONDER[0]),
+            sg.Combo(ct.PONDER_LIST, ct.K_PONDER[player + 2],
+                     size=(5, 1), key=ct.K_PONDER[player], readonly=True)]
+
+
+def st_row_tree_memory(player):
+    return [st_label(ct.K_TREE_MEMORY[0]),
+            sg.Combo(ct.TREE_MEMORY_LIST, ct.K_TREE_MEMORY[player + 2],
+                     size=(5, 1), key=ct.K_TREE_MEMORY[player],
+                     readonly=True)]
+
+
+def st_row_solver_nodes(player):
+    return [st_label(ct.K_SOLVER_NODES[0]),
+            sg.Combo(ct.SOLVER_NODES_LIST, ct.K_SOLVER_NODES[player + 2],
+                     size=(7, 1), key=ct.K_SOLVER_NODES[player],
+                     readonly=True)]
+
+
 def st_row_rotation(player):
     return [st_label(ct.K_ROTATION[0]),
             sg.Combo(ct.ROTATION_LIST, ct.K_ROTATION[player + 2], size=(15, 1),
@@ -356,6 +440,24 @@ def st_row_smart_root(player):
                         key=ct.K_SMART_ROOT[player])]
 
 
+def st_row_tactics(player):
+    return [st_label(ct.K_TACTICS[0]),
+            sg.Checkbox(text="", default=ct.K_TACTICS[player + 2],
+                        key=ct.K_TACTICS[player])]
+
+
+def st_row_prune_dead(player):
+    return [st_label(ct.K_PRUNE_DEAD[0]),
+            sg.Checkbox(text="", default=ct.K_PRUNE_DEAD[player + 2],
+                        key=ct.K_PRUNE_DEAD[player])]
+
+
+def st_row_transpositions(player):
+    return [st_label(ct.K_TRANSPOSITIONS[0]),
+            sg.Checkbox(text="", default=ct.K_TRANSPOSITIONS[player + 2],
+                        key=ct.K_TRANSPOSITIONS[player])]
+
+
 def st_tab_player(player):
     return [[sg.Text("")],
             st_row_color(player),
@@ -367,10 +469,23 @@ def st_tab_player(player):
             st_row_rotation(player),
             row_separator("   MCTS"),
             st_row_trials(player),
+            st_row_move_time(player),
+            st_row_game_time(player),
+            st_row_increment(player),
             st_row_smart_root(player),
+            st_row_transpositions(player),
+            st_row_tactics(player),
+            st_row_prune_dead(player),
             st_row_temperature(player),
             st_row_add_noise(player),
+            st_row_pattern_prior(player),
             st_row_cpuct(player),
+            st_row_batch_size(player),
+            st_row_threads(player),
+            st_row_processes(player),
+            st_row_ponder(player),
+            st_row_tree_memory(player),
+            st_row_solver_nodes(player),
             [sg.Text("")]
             ]
 
@@ -386,6 +501,9 @@ class SettingsDialogLayout:
         st_tab_general = [[sg.Text("")],
                           st_row_allow_swap(),
                           st_row_allow_scl(),
+                          st_row_engine(),
+                          st_row_eval_cache(),
+                          st_row_eval_store(),
                           row_separator(""),
                           [st_label(ct.K_BOARD_SIZE[0]),
                            sg.Combo(ct.BOARD_SIZE_LIST, ct.K_BOARD_SIZE[3],
@@ -119,8 +119,21 @@ class Settings:
         text += ct.K_ROTATION[0] + ":\t\t" + str(self.get(ct.K_ROTATION[player])) + "   \n"
         text += ct.K_LEVEL[0] + ":\t\t" + str(self.get(ct.K_LEVEL[player])) + "   \n"
         text += "----  MCTS  ------------------------\n"
+        text += ct.K_MOVE_TIME[0] + ":\t" + str(self.get(ct.K_MOVE_TIME[player])) + "   \n"
+        text += ct.K_GAME_TIME[0] + ":\t" + str(self.get(ct.K_GAME_TIME[player])) + "   \n"
+        text += ct.K_INCREMENT[0] + ":\t" + str(self.get(ct.K_INCREMENT[player])) + "   \n"
         text += ct.K_SMART_ROOT[0] + ":\t" + str(self.get(ct.K_SMART_ROOT[player])) + "   \n"
+        text += ct.K_TRANSPOSITIONS[0] + ":\t" + str(self.get(ct.K_TRANSPOSITIONS[player])) + "   \n"
+        text += ct.K_TACTICS[0] + ":\t\t" + str(self.get(ct.K_TACTICS[player])) + "   \n"
+        text += ct.K_PRUNE_DEAD[0] + ":\t" + str(self.get(ct.K_PRUNE_DEAD[player])) + "   \n"
         text += ct.K_TEMPERATURE[0] + ":\t" + str(self.get(ct.K_TEMPERATURE[player])) + "   \n"
         text += ct.K_ADD_NOISE[0] + ":\t" + str(self.get(ct.K_ADD_NOISE[player])) + "   \n"
-        text += ct.K_CPUCT[0] + ":\t\t" + str(self.get(ct.K_CPUCT[player])) + "   "
+        text += ct.K_PATTERN_PRIOR[0] + ":\t" + str(self.get(ct.K_PATTERN_PRIOR[player])) + "   \n"
+        text += ct.K_CPUCT[0] + ":\t\t" + str(self.get(ct.K_CPUCT[player])) + "   \n"
+        text += ct.K_BATCH_SIZE[0] + ":\t" + str(self.get(ct.K_BATCH_SIZE[player])) + "   \n"
+        text += ct.K_THREADS[0] + ":\t\t" + str(self.get(ct.K_THREADS[player])) + "   \n"
+        text += ct.K_PROCESSES[0] + ":\t" + str(self.get(ct.K_PROCESSES[player])) + "   \n"
+        text += ct.K_PONDER[0] + ":\t" + str(self.get(ct.K_PONDER[player])) + "   \n"
+        text += ct.K_TREE_MEMORY[0] + ":\t" + str(self.get(ct.K_TREE_MEMORY[player])) + "   \n"
+        text += ct.K_SOLVER_NODES[0] + ":\t" + str(self.get(ct.K_SOLVER_NODES[player])) + "   "
         return text
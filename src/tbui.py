@@ -65,6 +65,8 @@ class TwixtbotUI:
         self.moves_score = {}
         self.stgs = stgs
         self.bot_event = None
+        self.ponder_event = None
+        self.ponder_thread = None
         self.redo_moves = []
         self.next_move = None
         self.logger = logging.getLogger(ct.LOGGER)
@@ -271,12 +273,25 @@ class TwixtbotUI:
                        and max_value >= value + ct.MCTS_TRIAL_CHUNK):
                     max_value -= ct.MCTS_TRIAL_CHUNK
 
-            text = str(value) + "/" + str(max_value) + "      " + \
-                str(round(100 * value / max_value)) + "%      "
+            if "seconds" in values:
+                # time control: progress and ETA by the clock
+                elapsed = values["elapsed"]
+                seconds = max(values["seconds"], 0.001)
+                text = "%.1fs/%.1fs      " % (elapsed, seconds) + \
+                    str(round(100 * elapsed / seconds)) + "%      "
+                self.timer.update(100.0 * elapsed / seconds)
+                value = round(1000 * elapsed)
+                max_value = round(1000 * seconds)
+            else:
+                text = str(value) + "/" + str(max_value) + "      " + \
+                    str(round(100 * value / max_value)) + "%      "
 
-            v = 100.0 * (value + values["max"] - max_value) / values["max"]
-            self.timer.update(v)
+                v = 100.0 * (value + values["max"] - max_value) / \
+                    values["max"]
+                self.timer.update(v)
             text += self.timer.getstatus()
+            if "tree_mb" in values:
+                text += "      tree %d MB" % values["tree_mb"]
 
         self.get_control(ct.K_PROGRESS_NUM).Update(text)
         self.get_control(ct.K_PROGRESS_BAR).UpdateBar(value, max_value)
@@ -327,6 +342,9 @@ class TwixtbotUI:
     def reset_game(self):
         self.game.__init__(self.stgs.get(ct.K_ALLOW_SCL[1]))
         self.moves_score = {}
+        # game clocks start again
+        for bot in self.bots:
+            bot.clock = None
         # get eval of empty board to avoid gap at x=0 in plot in loaded games
         self.calc_eval()
 
@@ -357,8 +375,36 @@ class TwixtbotUI:
                     self.stgs.get(ct.K_ADD_NOISE[p]))
                 # update bot's mcts object
                 self.bots[t].nm.smart_root = self.stgs.get(ct.K_SMART_ROOT[p])
+                self.bots[t].nm.transpositions = self.stgs.get(
+                    ct.K_TRANSPOSITIONS[p])
+                self.bots[t].nm.tactics = self.stgs.get(ct.K_TACTICS[p])
+                self.bots[t].nm.prune_dead = self.stgs.get(
+                    ct.K_PRUNE_DEAD[p])
+                self.bots[t].nm.pattern_prior = float(
+                    self.stgs.get(ct.K_PATTERN_PRIOR[p]))
                 self.bots[t].nm.cpuct = float(
                     self.stgs.get(ct.K_CPUCT[p]))
+                self.bots[t].nm.batch_size = int(
+                    self.stgs.get(ct.K_BATCH_SIZE[p]))
+                self.bots[t].nm.threads = int(
+                    self.stgs.get(ct.K_THREADS[p]))
+                self.bots[t].processes = int(
+                    self.stgs.get(ct.K_PROCESSES[p]))
+                self.bots[t].ponder_cpu = int(
+                    self.stgs.get(ct.K_PONDER[p]))
+                self.bots[t].nm.tree_mb = int(
+                    self.stgs.get(ct.K_TREE_MEMORY[p]))
+                self.bots[t].nm.solver_nodes = int(
+                    self.stgs.get(ct.K_SOLVER_NODES[p]))
+                self.bots[t].move_time = float(
+                    self.stgs.get(ct.K_MOVE_TIME[p]))
+                game_time = float(self.stgs.get(ct.K_GAME_TIME[p]))
+                if game_time != self.bots[t].game_time:
+                    # new time control, new clock
+                    self.bots[t].game_time = game_time
+                    self.bots[t].clock = None
+                self.bots[t].increment = float(
+                    self.stgs.get(ct.K_INCREMENT[p]))
                 self.bots[t].nm.visualize_mcts = self.get_control(
                     ct.K_VISUALIZE_MCTS).get()
 
@@ -370,12 +416,27 @@ class TwixtbotUI:
             "trials": self.stgs.get(ct.K_TRIALS[player]),
             "level": self.stgs.get(ct.K_LEVEL[player]),
             "smart_root": self.stgs.get(ct.K_SMART_ROOT[player]),
+            "transpositions": self.stgs.get(ct.K_TRANSPOSITIONS[player]),
+            "tactics": self.stgs.get(ct.K_TACTICS[player]),
+            "prune_dead": self.stgs.get(ct.K_PRUNE_DEAD[player]),
             "temperature": self.stgs.get(ct.K_TEMPERATURE[player]),
             "rotation": self.stgs.get(ct.K_ROTATION[player]),
             "add_noise": self.stgs.get(ct.K_ADD_NOISE[player]),
+            "pattern_prior": self.stgs.get(ct.K_PATTERN_PRIOR[player]),
             "cpuct": self.stgs.get(ct.K_CPUCT[player]),
+            "batch_size": self.stgs.get(ct.K_BATCH_SIZE[player]),
+            "threads": self.stgs.get(ct.K_THREADS[player]),
+            "processes": self.stgs.get(ct.K_PROCESSES[player]),
+            "ponder": self.stgs.get(ct.K_PONDER[player]),
+            "tree_mb": self.stgs.get(ct.K_TREE_MEMORY[player]),
+            "solver_nodes": self.stgs.get(ct.K_SOLVER_NODES[player]),
+            "move_time": self.stgs.get(ct.K_MOVE_TIME[player]),
+            "game_time": self.stgs.get(ct.K_GAME_TIME[player]),
+            "increment": self.stgs.get(ct.K_INCREMENT[player]),
             "board": self.board,
-            "evaluator": evaluator
+            "evaluator": evaluator,
+            "eval_cache_mb": self.stgs.get(ct.K_EVAL_CACHE[1]),
+            "eval_store_mb": self.stgs.get(ct.K_EVAL_STORE[1])
         }
 
         import backend.nnmplayer as nnmplayer
@@ -405,9 +466,8 @@ class TwixtbotUI:
             # execute move must be inside thread!
             move = self._stochastic_choice(response)
             self.execute_move(move)
-        else:
-            # reset history_at_root resets tree and visit counts
-            self.bots[self.game.turn].nm.history_at_root = None
+        # else: cancelled. The bot keeps its tree and resumes from its
+        # visit counts when asked again.
 
         return
 
@@ -423,6 +483,27 @@ class TwixtbotUI:
         self.timer = pmeter.ETA(100.0, max_seconds=20)
         self.thread.start()
 
+    def start_pondering(self):
+        # let the bot that moves next search while a human is to move
+        if self.ponder_thread is not None or self.game_over(False):
+            return
+        t = 1 - self.game.turn
+        if (not self.stgs.get(ct.K_AUTO_MOVE[self.game.turn_to_player(t)])
+                or self.bots[t].ponder_cpu == 0):
+            return
+        self.ponder_event = BotEvent()
+        self.ponder_thread = threading.Thread(
+            target=self.bots[t].ponder,
+            args=(self.game.clone(), self.ponder_event), daemon=True)
+        self.ponder_thread.start()
+
+    def stop_pondering(self):
+        # the tree stays with the bot
+        if self.ponder_thread is not None:
+            self.ponder_event.set_context(ct.CANCEL_EVENT)
+            self.ponder_thread.join()
+            self.ponder_thread = None
+
     # handle events
     def handle_board_click(self, values):
         if self.game_over():
@@ -850,7 +931,8 @@ def main():
     # logger = logging.getLogger(ct.LOGGER)
 
     # initialize game, pass "allow self crossing links" setting
-    game = twixt.Game(stgs.get(ct.K_ALLOW_SCL[1]))
+    game = twixt.create_game(stgs.get(ct.K_ALLOW_SCL[1]),
+                             stgs.get(ct.K_ENGINE[1]))
 
     # initialize twixt board (draw it later)
     board = uiboard.UiBoard(game, stgs)
@@ -868,13 +950,18 @@ def main():
                 ui.ui_to_be_updated.clear()
             if ui.get_current(ct.K_AUTO_MOVE):
                 ui.bot_move()
+            else:
+                ui.start_pondering()
 
         event, values = ui.get_event()
 
         if event == "__TIMEOUT__":
             continue
 
-        elif event == sg.WIN_CLOSED or event == ct.EVENT_EXIT:
+        # any input stops pondering, it resumes when the UI is idle again
+        ui.stop_pondering()
+
+        if event == sg.WIN_CLOSED or event == ct.EVENT_EXIT:
             if ui.thread_is_alive():
                 ui.handle_cancel_bot()
 
@@ -0,0 +1,75 @@
+""" Positions for the tests """
+import backend.geometry as geo
+import backend.twixt as twixt
+
+
+def random_moves(rng, length, allow_swap=False):
+    """ Legal moves of a random game, cut at length or at a win """
+    game = twixt.create_game(False, "bitboard")
+    moves = []
+    while len(moves) < length and not game.just_won():
+        if allow_swap and len(moves) == 1 and rng.random() < 0.5:
+            move = twixt.SWAP
+        else:
+            p = geo.point_of(rng.randrange(geo.NCELLS))
+            if (not twixt.Game.inbounds_for_player(p, game.turn) or
+                    game.get_peg(p, 0) or game.get_peg(p, 1)):
+                continue
+            move = p
+        game.play(move)
+        moves.append(move)
+    return moves
+
+
+def winning_chain(color):
+    """ Shortest chain of linked cells of color between its lines """
+    start = list(geo.bits_of(geo.START_LINE[color]))
+    parent = {cell: None for cell in start}
+    queue = list(start)
+    for cell in queue:
+        if (geo.END_LINE[color] >> cell) & 1:
+            chain = []
+            while cell is not None:
+                chain.append(cell)
+                cell = parent[cell]
+            return [geo.point_of(c) for c in reversed(chain)]
+        for nb, _, _ in geo.LINK_SLOTS[cell]:
+            if (geo.PLAYABLE[color] >> nb) & 1 and nb not in parent:
+                parent[nb] = cell
+                queue.append(nb)
+
+
+def distance(p, q):
+    return max(abs(p.x - q.x), abs(p.y - q.y))
+
+
+def far_moves(color, chain, count):
+    """ Cells of color that neither link to each other nor come near
+        chain """
+    moves = []
+    for cell in geo.bits_of(geo.PLAYABLE[color]):
+        p = geo.point_of(cell)
+        if (all(distance(p, q) >= 4 for q in chain) and
+                all(distance(p, q) >= 3 for q in moves)):
+            moves.append(p)
+            if len(moves) == count:
+                return moves
+
+
+def chain_game(engine, skip, to_move):
+    """ Game in which the first player linked its winning chain but the
+        pegs at the indices in skip, while the opponent played far away.
+        to_move is 0 for the first player and 1 for the opponent. Returns
+        the game and the chain """
+    game = twixt.create_game(False, engine)
+    color = game.turn
+    chain = winning_chain(color)
+    skip = {i % len(chain) for i in skip}
+    pegs = [p for i, p in enumerate(chain) if i not in skip]
+    replies = far_moves(1 - color, chain, len(pegs))
+    for p, reply in zip(pegs, replies):
+        game.play(p)
+        game.play(reply)
+    if to_move:
+        game.undo()
+    return game, chain
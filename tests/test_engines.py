@@ -0,0 +1,102 @@
+import random
+
+import pytest
+
+import backend.geometry as geo
+import backend.twixt as twixt
+from positions import far_moves, random_moves, winning_chain
+
+ENGINES = ("numpy", "bitboard")
+SLOTS = sorted({slot for cell in range(geo.NCELLS)
+                for _, slot, _ in geo.LINK_SLOTS[cell]})
+
+
+def state(game):
+    """ Everything both engines must agree on """
+    return (game.turn,
+            [game.peg_bits(color) for color in range(2)],
+            [[bool(game.get_link_slot(slot, color)) for slot in SLOTS]
+             for color in range(2)],
+            [game.is_winning(color) for color in range(2)],
+            game.result,
+            game.position_key(),
+            game.normalized_key())
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_engines_agree(seed):
+    rng = random.Random(seed)
+    moves = random_moves(rng, rng.randint(10, 150), allow_swap=True)
+    games = [twixt.create_game(False, engine) for engine in ENGINES]
+
+    states = [state(games[0])]
+    for move in moves:
+        for game in games:
+            game.play(move, check_draw=True)
+        states.append(state(games[0]))
+        assert state(games[1]) == states[-1]
+
+    for expected in reversed(states[:-1]):
+        for game in games:
+            game.undo(check_draw=True)
+            assert state(game) == expected
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_keys_round_trip(engine):
+    rng = random.Random(1)
+    game = twixt.create_game(False, engine)
+    assert (game.zkey, game.zkey_t) == (0, 0)
+    assert game.position_key() == 0
+
+    moves = random_moves(rng, 60, allow_swap=True)
+    for move in moves:
+        game.play(move)
+    for _ in moves:
+        game.undo()
+    assert (game.zkey, game.zkey_t) == (0, 0)
+    assert game.position_key() == 0
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_keys_of_move_orders_and_swap(engine):
+    a = twixt.create_game(False, engine)
+    b = twixt.create_game(False, engine)
+    for move in ["d5", "k10", "f8", "l12"]:
+        a.play(twixt.Point(move))
+    for move in ["f8", "l12", "d5", "k10"]:
+        b.play(twixt.Point(move))
+    assert a.position_key() == b.position_key()
+    assert a.normalized_key() == b.normalized_key()
+
+    # the net sees the same position before and after a swap
+    game = twixt.create_game(False, engine)
+    game.play(twixt.Point("d5"))
+    key = game.normalized_key()
+    game.play(twixt.SWAP)
+    assert game.normalized_key() == key
+    game.undo()
+    assert game.normalized_key() == key
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_win_and_undo(engine):
+    game = twixt.create_game(False, engine)
+    winner = game.turn
+    chain = winning_chain(winner)
+    replies = far_moves(1 - winner, chain, len(chain))
+
+    for i, (move, reply) in enumerate(zip(chain, replies)):
+        assert not game.is_winning(winner)
+        game.play(move)
+        if i < len(chain) - 1:
+            assert not game.just_won()
+            game.play(reply)
+    assert game.just_won()
+    assert game.is_winning(winner)
+    assert not game.is_winning(1 - winner)
+
+    game.undo()
+    assert not game.is_winning(winner)
+    game.play(chain[-1])
+    assert game.just_won()
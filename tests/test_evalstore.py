@@ -0,0 +1,71 @@
+import numpy
+
+import backend.evalstore as evalstore
+
+FINGERPRINT = "0123456789abcdef" * 2
+NUM_VALUES = 1
+NUM_LOGITS = 4
+RECORD_BYTES = 8 + 2 * (NUM_VALUES + NUM_LOGITS)
+
+
+def open_store(folder, records):
+    return evalstore.EvalStore(
+        str(folder), FINGERPRINT,
+        evalstore.HEADER_BYTES + records * RECORD_BYTES,
+        NUM_VALUES, NUM_LOGITS)
+
+
+def result(k):
+    return (numpy.full(NUM_VALUES, k / 4, numpy.float32),
+            numpy.arange(NUM_LOGITS, dtype=numpy.float32) + k)
+
+
+def put(store, keys):
+    for k in keys:
+        store.put((k, 0), result(k))
+    store.flush()
+
+
+def check(store, k):
+    found = store.get((k, 0))
+    assert found is not None, k
+    value, logits = result(k)
+    assert (found[0][0] == value).all()
+    assert (found[1][0] == logits).all()
+
+
+def test_put_and_reopen(tmp_path):
+    store = open_store(tmp_path, 100)
+    put(store, range(50))
+    check(store, 7)
+    assert store.get((50, 0)) is None
+
+    store = open_store(tmp_path, 100)
+    assert len(store) == 50
+    check(store, 7)
+    check(store, 49)
+
+
+def test_compact_keeps_used(tmp_path):
+    store = open_store(tmp_path, 100)
+    put(store, range(50))
+    for k in range(10):
+        check(store, k)
+
+    # beyond 100 records the store is compacted to the 75 used and newest
+    put(store, range(50, 120))
+    assert len(store) == 75
+    assert store.get((20, 0)) is None
+    assert store.get((54, 0)) is None
+
+    # the records used before survive a second compaction, too
+    put(store, range(120, 200))
+    assert len(store) == 75
+    for k in range(10):
+        check(store, k)
+    check(store, 135)
+    assert store.get((134, 0)) is None
+
+    store = open_store(tmp_path, 100)
+    check(store, 0)
+    check(store, 199)
@@ -0,0 +1,105 @@
+import numpy
+import pytest
+
+import constants as ct
+import backend.evalstore as evalstore
+import backend.naf as naf
+import backend.nneval as nneval
+import backend.nnmplayer as nnmplayer
+import backend.twixt as twixt
+from backend.evalcache import EvalCache
+
+S = twixt.Game.SIZE
+KNIGHT = [(1, 2), (2, 1), (2, -1), (1, -2),
+          (-1, -2), (-2, -1), (-2, 1), (-1, 2)]
+
+
+class FakeNetEvaluater(nneval.NNEvaluater):
+    """ NNEvaluater with a fake net instead of a model: an even score,
+        and a policy that likes the empty cells a link away from a peg
+        of the player to move. It counts its runs. """
+
+    def __init__(self, cache_mb=0, store=None):
+
+        self.use_recents = False
+        self.max_batch = 4
+        self.cache = EvalCache(cache_mb * 2**20) if cache_mb else None
+        self.store = store
+        self.runs = 0
+
+    def _run(self, nips):
+
+        self.runs += 1
+        movelogits = numpy.zeros((len(nips), S * (S - 2)), numpy.float32)
+        for i, nip in enumerate(nips):
+            pegs, _, _ = nip.to_input_arrays()
+            grid = numpy.zeros((S, S), numpy.float32)
+            for x, y in zip(*pegs[:, :, 1].nonzero()):
+                for dx, dy in KNIGHT:
+                    if 0 <= x + dx < S and 0 <= y + dy < S:
+                        grid[x + dx, y + dy] = 5
+            grid[pegs.sum(axis=2) > 0] = 0
+            movelogits[i] = grid[1:S - 1].reshape(-1)
+        return numpy.zeros((len(nips), 3), numpy.float32), movelogits
+
+
+def game_of(moves):
+    game = twixt.create_game(False, "bitboard")
+    for move in moves:
+        game.play(twixt.Point(move))
+    return game
+
+
+def test_repeated_position_skips_the_net():
+    evaluator = FakeNetEvaluater(cache_mb=1)
+    nip = naf.NetInputs(game_of(["d5", "k10"]))
+
+    first = evaluator.eval_one(nip)
+    assert evaluator.runs == 1
+    second = evaluator.eval_many([nip, nip.rotated(1), nip])
+    assert evaluator.runs == 2
+    assert (second[0][1] == first[1]).all()
+    assert (second[2][1] == first[1]).all()
+    assert evaluator.cache.hits == 2
+
+
+def test_store_fills_the_cache(tmp_path):
+    def open_store():
+        return evalstore.EvalStore(str(tmp_path), "0" * 32, 2**20, 3,
+                                   S * (S - 2))
+
+    nip = naf.NetInputs(game_of(["d5", "k10"]))
+    evaluator = FakeNetEvaluater(store=open_store())
+    expected = evaluator.eval_one(nip)
+    evaluator.store.flush()
+
+    evaluator = FakeNetEvaluater(cache_mb=1, store=open_store())
+    result = evaluator.eval_one(nip)
+    assert evaluator.runs == 0
+    assert evaluator.store.hits == 1
+    # float16 in the store
+    assert numpy.allclose(result[1], expected[1], atol=0.01)
+    evaluator.eval_one(nip)
+    assert evaluator.store.hits == 1
+    assert evaluator.cache.hits == 1
+
+
+@pytest.mark.parametrize("rotation", [ct.ROT_OFF, ct.ROT_FLIP_HOR,
+                                      ct.ROT_FLIP_VERT, ct.ROT_FLIP_BOTH,
+                                      ct.ROT_AVG])
+@pytest.mark.parametrize("moves", [["d5", "k10", "f8"],
+                                   ["d5", "k10", "f8", "l12"]])
+def test_rotations_and_colors_map_back(rotation, moves):
+    game = game_of(moves)
+    player = nnmplayer.Player(model="fake", evaluator=FakeNetEvaluater(),
+                              rotation=rotation)
+
+    _, logits = player.nm.sap(game)
+    best = {naf.policy_index_point(game, ix)
+            for ix in numpy.flatnonzero(logits == logits.max())}
+    own = [twixt.Point(m) for m in moves[len(moves) % 2::2]]
+    expected = {twixt.Point(p.x + dx, p.y + dy)
+                for p in own for dx, dy in KNIGHT
+                if twixt.Game.inbounds_for_player(
+                    twixt.Point(p.x + dx, p.y + dy), game.turn)}
+    assert best == expected
@@ -0,0 +1,321 @@
+import time
+
+import numpy
+import pytest
+
+import backend.naf as naf
+import backend.nnmcts as nnmcts
+import backend.twixt as twixt
+import positions
+
+POLICY_SIZE = len(naf.POLICY_POINTS[0])
+BIAS = numpy.random.RandomState(1).normal(size=POLICY_SIZE) * 3
+
+
+def sap(game):
+    """ Fixed fake net: score and logits from the position """
+    r = numpy.random.RandomState(game.normalized_key() & 0xffffffff)
+    return r.uniform(-0.5, 0.5), BIAS + 0.3 * r.normal(size=POLICY_SIZE)
+
+
+def test_tree_survives_undo_eval_redo():
+    game = twixt.create_game(False, "bitboard")
+    for move in ["d5", "k10", "l12", "f8"]:
+        game.play(twixt.Point(move))
+    m = nnmcts.NeuralMCTS(sap, add_noise=0, level=1.0)
+
+    N = m.mcts(game, 400, None, None)
+    best = naf.policy_index_point(game, int(N.argmax()))
+    game.play(best)
+    m.mcts(game, 100, None, None)
+
+    game.undo()
+    m.eval_game(game)
+    assert m.root.Nsum >= 400
+
+    game.play(best)
+    m.eval_game(game)
+    assert m.root.Nsum > N.max()
+
+
+def test_tree_survives_swap_eval():
+    game = twixt.create_game(False, "bitboard")
+    game.play(twixt.Point("d5"))
+    m = nnmcts.NeuralMCTS(sap, add_noise=0, level=1.0)
+
+    m.mcts(game, 200, None, None)
+    game.play(twixt.SWAP)
+    m.eval_game(game)
+    assert m.root.Nsum >= 200
+
+
+class MissingMoveSolver:
+    """ Solver that proves a win with a move the root has no edge for """
+
+    def __init__(self, move):
+        self.move = move
+
+    def solve(self, game, max_nodes, event=None):
+        return 1, self.move
+
+
+def test_solved_move_without_edge_keeps_searching(monkeypatch):
+    monkeypatch.setattr(nnmcts.pnsearch, "worth_solving", lambda game: True)
+    game = twixt.create_game(False, "bitboard")
+    for move in ["d5", "k10", "l12", "f8"]:
+        game.play(twixt.Point(move))
+    m = nnmcts.NeuralMCTS(sap, add_noise=0, level=1.0, solver_nodes=100)
+    # an occupied cell, which the root has no edge for
+    m.solver = MissingMoveSolver(twixt.Point("d5"))
+
+    N = m.mcts(game, 100, None, None)
+    assert not m.root.proven
+    assert N.sum() > 0
+
+
+def test_tactical_leaf_of_win_in_one():
+    game, chain = positions.chain_game("bitboard", {-1}, 0)
+    m = nnmcts.NeuralMCTS(sap, add_noise=0, tactics=True)
+
+    leaf = m.expand_leaf(game)
+    assert leaf.proven and leaf.score == 1
+    win = naf.policy_index_point(game, leaf.moves[leaf.winning_edge])
+    game.play(win)
+    assert game.just_won()
+
+
+def test_tactical_leaf_of_unstoppable_win():
+    game, chain = positions.chain_game("bitboard", {-1}, 1)
+    m = nnmcts.NeuralMCTS(sap, add_noise=0, tactics=True)
+
+    leaf = m.expand_leaf(game)
+    assert leaf.proven and leaf.score == -1
+
+
+def test_tactical_leaf_keeps_only_stopping_moves():
+    game, chain = positions.chain_game("bitboard", {6}, 1)
+    m = nnmcts.NeuralMCTS(sap, add_noise=0, tactics=True)
+
+    leaf = m.expand_leaf(game)
+    assert not leaf.proven
+    moves = [naf.policy_index_point(game, ix) for ix in leaf.moves]
+    assert moves == [chain[6]]
+
+
+def test_prune_dead_cells():
+    game = twixt.create_game(False, "bitboard")
+    # c24 and v24 are dead: every link from them is blocked
+    for move in "d24 d22 j9 b23 e22 i21 u24 u22 o9 w23 t22 p21".split():
+        game.play(twixt.Point(move))
+    dead = [naf.policy_point_index(game.turn, twixt.Point(p))
+            for p in ("c24", "v24")]
+    legal = naf.legal_move_policy_array(game)
+    m = nnmcts.NeuralMCTS(sap, add_noise=0, prune_dead=True)
+
+    m.prune_dead_cells(game, legal)
+    assert legal[dead].sum() == 1
+    assert legal.sum() == naf.legal_move_policy_array(game).sum() - 1
+
+    # with only one of them legal, that one stays
+    legal = naf.legal_move_policy_array(game)
+    legal[dead[0]] = 0
+    m.prune_dead_cells(game, legal)
+    assert legal[dead[1]] == 1
+
+
+def test_prune_dead_cells_keeps_stopping_moves():
+    game, chain = positions.chain_game("bitboard", {6}, 1)
+    m = nnmcts.NeuralMCTS(sap, add_noise=0, tactics=True, prune_dead=True)
+
+    leaf = m.expand_leaf(game)
+    moves = [naf.policy_index_point(game, ix) for ix in leaf.moves]
+    assert moves == [chain[6]]
+
+
+def test_tactical_leaf_without_legal_stopping_move():
+    game, chain = positions.chain_game("bitboard", {6}, 1)
+    m = nnmcts.NeuralMCTS(sap, add_noise=0, tactics=True)
+    legal = naf.legal_move_policy_array(game)
+    legal[naf.policy_point_index(game.turn, chain[6])] = 0
+
+    # a restriction to no moves at all would score as a draw
+    leaf = m.tactical_leaf(game, legal)
+    assert leaf.proven and leaf.score == -1
+
+
+def check_node(node):
+    """ Nsum, lead, n1 and n2 agree with the edges """
+    assert node.Nsum == node.N.sum()
+    live = numpy.flatnonzero(node.LM)
+    if not len(live):
+        return
+    N = numpy.sort(node.N[live])
+    assert node.LM[node.lead]
+    assert node.n1 == node.N[node.lead] == N[-1]
+    assert node.n2 == (N[-2] if len(live) > 1 else N[-1])
+
+
+def walk(node):
+    yield node
+    for sub in (node.subnodes or {}).values():
+        yield from walk(sub)
+
+
+def test_prune_tree():
+    game = twixt.create_game(False, "bitboard")
+    for move in ["d5", "k10", "l12", "f8"]:
+        game.play(twixt.Point(move))
+    m = nnmcts.NeuralMCTS(sap, add_noise=0, level=1.0)
+    m.mcts(game, 1000, None, None)
+    root = m.root
+    N = root.N.copy()
+    line = [root]
+    while line[-1].subnode(line[-1].lead) is not None and len(line) < 4:
+        line.append(line[-1].subnode(line[-1].lead))
+
+    m.tree_mb = m.tree_bytes() / 2**20 / 2
+    assert m.over_budget()
+    assert m.prune_tree()
+    assert m.tree_bytes() <= nnmcts.PRUNE_RATIO * m.tree_mb * 2**20
+    assert m.root is root
+    assert (root.N == N).all()
+    # the line of the most visited moves stays
+    for node, sub in zip(line, line[1:]):
+        assert node.subnode(node.lead) is sub
+    for node in walk(root):
+        check_node(node)
+
+    # the search goes on in the smaller tree
+    m.mcts(game, 1000, None, None)
+    assert m.root.Nsum == 2000
+    assert m.tree_bytes() <= m.tree_mb * 2**20
+    for node in walk(m.root):
+        check_node(node)
+
+
+def test_trees_of_move_orders_with_recents():
+    a = twixt.create_game(False, "bitboard")
+    for move in ["d5", "k10", "f8", "l12"]:
+        a.play(twixt.Point(move))
+    b = twixt.create_game(False, "bitboard")
+    for move in ["f8", "l12", "d5", "k10"]:
+        b.play(twixt.Point(move))
+
+    for recents, shared in ((False, True), (True, False)):
+        m = nnmcts.NeuralMCTS(sap, add_noise=0, level=1.0,
+                              recents=recents)
+        m.mcts(a, 100, None, None)
+        m.history_at_root = None
+        m.compute_root(a)
+        assert m.root is not None
+        m.history_at_root = None
+        m.compute_root(b)
+        assert (m.root is not None) == shared
+
+
+PREFERRED = {twixt.Game.WHITE: [twixt.Point("f10"), twixt.Point("p10")],
+             twixt.Game.BLACK: [twixt.Point("k5")]}
+
+
+def narrow_sap(game):
+    """ Fake net that only likes a few moves, so that the search runs
+        into the transposition f10 k5 p10 / p10 k5 f10 """
+    logits = numpy.full(POLICY_SIZE, -10.0)
+    for p in PREFERRED[game.turn]:
+        if not (game.get_peg(p, 0) or game.get_peg(p, 1)):
+            logits[naf.policy_point_index(game.turn, p)] = 10
+    return 0.0, logits
+
+
+def follow(root, moves):
+    """ Node at the end of moves and the parent edge of its last move """
+    game = twixt.create_game(False, "bitboard")
+    node = root
+    for p in moves:
+        parent = node
+        index = node.edge(naf.policy_point_index(game.turn, p))
+        game.play(p)
+        node = node.subnode(index)
+    return node, parent.N[index]
+
+
+def test_transpositions_share_nodes():
+    f10, p10 = PREFERRED[twixt.Game.WHITE]
+    k5, = PREFERRED[twixt.Game.BLACK]
+    game = twixt.create_game(False, "bitboard")
+    m = nnmcts.NeuralMCTS(narrow_sap, add_noise=0, level=1.0,
+                          transpositions=True)
+    m.mcts(game, 200, None, None)
+
+    a, na = follow(m.root, [f10, k5, p10])
+    b, nb = follow(m.root, [p10, k5, f10])
+    assert a is b
+    assert m.evals_saved == 1
+    # both edges back up into the shared node; their first visits
+    # expanded it and looked it up
+    assert a.Nsum == na + nb - 2
+    assert m.root.Nsum == 200
+
+    # a move on drops the tables of the plies before it
+    game.play(f10)
+    m.mcts(game, 100, None, None)
+    assert min(m.tt) == len(game.history)
+    assert m.tt[len(game.history)][game.position_key()] is m.root
+
+
+def test_no_transpositions_with_recents():
+    game = twixt.create_game(False, "bitboard")
+    m = nnmcts.NeuralMCTS(narrow_sap, add_noise=0, level=1.0,
+                          transpositions=True, recents=True)
+    m.mcts(game, 200, None, None)
+    assert m.evals_saved == 0
+    assert not m.tt
+
+
+def sap_many(games):
+    return [sap(game) for game in games]
+
+
+def check_search(m, trials):
+    """ All virtual losses are taken back and every trial is counted """
+    assert m.root.Nsum == trials
+    for node in walk(m.root):
+        assert node.VL is None
+        check_node(node)
+
+
+def test_batched_search():
+    game = twixt.create_game(False, "bitboard")
+    for move in ["d5", "k10", "l12", "f8"]:
+        game.play(twixt.Point(move))
+    m = nnmcts.NeuralMCTS(sap, add_noise=0, level=1.0, sap_many=sap_many,
+                          batch_size=8)
+    m.mcts(game, 500, None, None)
+    check_search(m, 500)
+
+
+@pytest.mark.parametrize("batch_size", [1, 4])
+def test_threaded_search(batch_size):
+    game = twixt.create_game(False, "bitboard")
+    for move in ["d5", "k10", "l12", "f8"]:
+        game.play(twixt.Point(move))
+    m = nnmcts.NeuralMCTS(sap, add_noise=0, level=1.0, sap_many=sap_many,
+                          batch_size=batch_size, threads=4)
+    m.mcts(game, 500, None, None)
+    check_search(m, 500)
+
+    # and once more from the tree it leaves
+    m.mcts(game, 300, None, None)
+    check_search(m, 800)
+
+
+def test_search_stops_in_time():
+    game = twixt.create_game(False, "bitboard")
+    for move in ["d5", "k10"]:
+        game.play(twixt.Point(move))
+    m = nnmcts.NeuralMCTS(sap, add_noise=0, level=1.0)
+
+    start = time.time()
+    m.mcts(game, 10**6, None, None, seconds=0.3)
+    assert time.time() - start < 2
+    assert 0 < m.root.Nsum < 10**6
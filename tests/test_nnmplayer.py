@@ -0,0 +1,65 @@
+import numpy
+
+import backend.naf as naf
+import backend.nnmplayer as nnmplayer
+import backend.twixt as twixt
+
+POLICY_SIZE = len(naf.POLICY_POINTS[0])
+
+
+class FakeEvaluater:
+    """ Stands in for nneval.NNEvaluater: an even score and a flat
+        policy for every position """
+
+    use_recents = False
+    cache = None
+    store = None
+
+    def eval_many(self, nips):
+        return [[numpy.zeros((1, 3), numpy.float32),
+                 numpy.zeros((1, POLICY_SIZE), numpy.float32)]
+                for _ in nips]
+
+
+def make_player(**kwargs):
+    return nnmplayer.Player(model="fake", evaluator=FakeEvaluater(),
+                            allow_swap=0, **kwargs)
+
+
+def test_reused_visits_count_as_trials():
+    game = twixt.create_game(False, "bitboard")
+    for move in ["d5", "k10"]:
+        game.play(twixt.Point(move))
+    player = make_player(trials=100)
+
+    player.pick_move(game)
+    assert player.nm.root.Nsum == 100
+    # without pondering, too, the search tops up the tree it reuses
+    player.pick_move(game)
+    assert player.nm.root.Nsum == 100
+    player.num_trials = 150
+    player.pick_move(game)
+    assert player.nm.root.Nsum == 150
+
+
+def test_time_budget():
+    assert make_player().time_budget() is None
+    assert make_player(move_time=3).time_budget() == 3
+
+    # the clock starts at the game time and is shared out over
+    # MOVES_TO_GO moves, plus the increment
+    player = make_player(game_time=10, increment=5)
+    assert player.time_budget() == 600 / nnmplayer.MOVES_TO_GO + 5
+    assert player.clock == 600
+
+    # half of the clock is kept in any case
+    player.clock = 10
+    assert player.time_budget() == 5
+    player.clock = -1
+    assert player.time_budget() == 0
+
+    # the time per move caps the share of the clock
+    player = make_player(game_time=10, move_time=3)
+    assert player.time_budget() == 3
+    player.clock = 30
+    assert player.time_budget() == 30 / nnmplayer.MOVES_TO_GO
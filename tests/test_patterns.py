@@ -0,0 +1,51 @@
+import pytest
+
+import backend.patterns as patterns
+import backend.twixt as twixt
+
+ENGINES = ("numpy", "bitboard")
+
+
+def fresh_codes(game):
+    return patterns.PatternCodes(game).codes
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_undo_past_start_of_tracking(engine):
+    game = twixt.create_game(False, engine)
+    game.play(twixt.Point("c3"))
+    game.play(twixt.Point("d5"))
+    game.patterns = patterns.PatternCodes(game)
+    game.play(twixt.Point("f6"))
+
+    while game.history:
+        game.undo(True)
+        assert (game.patterns.codes == fresh_codes(game)).all()
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_swap_after_start_of_tracking(engine):
+    game = twixt.create_game(False, engine)
+    game.play(twixt.Point("d5"))
+    game.patterns = patterns.PatternCodes(game)
+
+    game.play(twixt.SWAP)
+    assert (game.patterns.codes == fresh_codes(game)).all()
+    game.undo()
+    assert (game.patterns.codes == fresh_codes(game)).all()
+    game.undo()
+    assert (game.patterns.codes == fresh_codes(game)).all()
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_tracking_after_swapped_cell_is_replayed(engine):
+    game = twixt.create_game(False, engine)
+    game.play(twixt.Point("d5"))
+    game.play(twixt.SWAP)
+    # d5 is empty again after the swap
+    game.play(twixt.Point("d5"))
+    game.patterns = patterns.PatternCodes(game)
+
+    while game.history:
+        game.undo()
+        assert (game.patterns.codes == fresh_codes(game)).all()
@@ -0,0 +1,39 @@
+import backend.pnsearch as pnsearch
+import positions
+
+
+def solve(skip, to_move, max_nodes=10000):
+    game, chain = positions.chain_game("bitboard", skip, to_move)
+    score, move = pnsearch.ProofNumberSearch().solve(game, max_nodes)
+    return game, chain, score, move
+
+
+def test_win_in_one():
+    game, chain, score, move = solve({-1}, 0)
+    assert score == 1
+    game.play(move)
+    assert game.just_won()
+
+
+def test_forced_win():
+    # the missing peg of the chain makes two wins, no reply stops both
+    game, chain, score, move = solve({6, -1}, 0, 100000)
+    assert (score, move) == (1, chain[6])
+
+
+def test_forced_loss():
+    game, chain, score, move = solve({-1}, 1)
+    assert (score, move) == (-1, None)
+
+
+def test_open_position():
+    # the defender can take the missing peg of the chain
+    game, chain, score, move = solve({6, -1}, 1)
+    assert (score, move) == (None, None)
+
+
+def test_worth_solving():
+    game, chain = positions.chain_game("bitboard", {-1}, 1)
+    assert pnsearch.worth_solving(game)
+    game, chain = positions.chain_game("bitboard", {6, -1}, 1)
+    assert not pnsearch.worth_solving(game)
@@ -0,0 +1,33 @@
+import pytest
+
+import backend.geometry as geo
+import backend.tactics as tactics
+import positions
+
+ENGINES = ("numpy", "bitboard")
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_winning_cells(engine):
+    game, chain = positions.chain_game(engine, {-1}, 0)
+
+    wins = tactics.winning_cells(game, game.turn)
+    assert geo.cell_of(chain[-1]) in wins
+    assert tactics.winning_cells(game, 1 - game.turn) == []
+    for cell in wins:
+        game.play(geo.point_of(cell))
+        assert game.just_won()
+        game.undo()
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_must_play(engine):
+    game, chain = positions.chain_game(engine, {6}, 1)
+    assert tactics.must_play(game) == 1 << geo.cell_of(chain[6])
+
+    # two wins at the end line, no peg stops both
+    game, chain = positions.chain_game(engine, {-1}, 1)
+    assert tactics.must_play(game) == 0
+
+    game, chain = positions.chain_game(engine, {6, -1}, 1)
+    assert tactics.must_play(game) is None